@@ -0,0 +1,68 @@
+"""Latency of a 3-stage pipeline run as an in-process chain vs as separate functions connected through Redis.
+
+Stages: mymodule.handler (metrics -> averages), a summary of the averages, an alert on the summary.
+Each Redis hop is what a pod in between adds besides its polling delay: encoding the output, a SET, a GET and
+decoding it (with the poll trigger every hop also waits up to REDIS_MONITORING_PERIOD, not counted here).
+Needs a local redis-server.
+
+Usage: python benchmarks/bench_chaining.py [--invocations 1000]
+"""
+import argparse
+import os
+import time
+
+from common import FUNCTION_DIR, RUNTIME_DIR, add_to_path, connect_redis, percentile, quiet_logging
+from generator import generate_snapshots
+
+os.environ.setdefault("METRICS_PORT", "0")
+add_to_path(RUNTIME_DIR, FUNCTION_DIR)
+
+import mymodule
+from chaining import build_chain
+from context import Context
+from redis_utils import decode_data, encode_data, get_raw
+
+def summarize(input, context):
+    cpu = [value for key, value in input.items() if key.startswith("avg-util-cpu")]
+    return {"cpu-max": max(cpu), "cpu-mean": sum(cpu) / len(cpu), "percent-memory-cache": input["percent-memory-cache"]}
+
+def alert(input, context):
+    return {**input, "cpu-alert": input["cpu-max"] > 90.0}
+
+STAGES = [("handler", mymodule.handler), ("summarize", summarize), ("alert", alert)]
+
+def run_chain(inputs):
+    chain = build_chain(STAGES, taps="")
+    context = Context(host=None, port=None, input_key="metrics", output_key="output")
+    latencies = []
+    for data in inputs:
+        started = time.perf_counter()
+        encode_data("output", chain(data, context))
+        latencies.append((time.perf_counter() - started) * 1e6)
+    return latencies
+
+def run_hops(inputs, redis_client):
+    # One context per "pod", each stage reads the key the previous one wrote
+    contexts = [Context(host=None, port=None, input_key=f"bench:chain:{index}", output_key=f"bench:chain:{index + 1}") for index in range(len(STAGES))]
+    latencies = []
+    for data in inputs:
+        started = time.perf_counter()
+        for (_, handler), context in zip(STAGES, contexts):
+            output = handler(data, context)
+            redis_client.set(context.output_key, encode_data(context.output_key, output))
+            data = decode_data(context.output_key, get_raw(redis_client, context.output_key))
+        latencies.append((time.perf_counter() - started) * 1e6)
+    return latencies
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--invocations", type=int, default=1000)
+    args = parser.parse_args()
+
+    quiet_logging()
+    redis_client = connect_redis(decode_responses=False)
+    print(f"{'cores':>5} {'mode':<10} {'p50 (us)':>9} {'p99 (us)':>9}")
+    for cores in (8, 64, 256):
+        inputs = generate_snapshots(cores, args.invocations)
+        for name, latencies in (("chain", run_chain(inputs)), ("redis-hops", run_hops(inputs, redis_client))):
+            print(f"{cores:>5} {name:<10} {percentile(latencies, 50):>9.1f} {percentile(latencies, 99):>9.1f}")
@@ -0,0 +1,115 @@
+"""CPU time per cycle when the collector publishes less often than the runtime polls.
+
+Every cycle re-reads the raw input value; with change detection the unchanged ones are hashed and dropped
+instead of being decoded, handed to the handler and written back.
+
+Before timing, a restart is checked against the redis-server at BENCH_REDIS_HOST / BENCH_REDIS_PORT (skipped when
+it can't be reached): the input fingerprint is snapshotted with the context, so a restarted runtime doesn't feed the
+last input in again and count its CPU samples twice.
+
+Usage: python benchmarks/bench_change_detection.py [--cores 64] [--cycles 5000]
+"""
+import argparse
+import datetime
+import json
+import os
+import sys
+import time
+import types
+
+from common import BENCH_REDIS_HOST, BENCH_REDIS_PORT, RUNTIME_DIR, FUNCTION_DIR, add_to_path, make_metrics_snapshot, quiet_logging
+
+os.environ.setdefault("METRICS_PORT", "0")
+add_to_path(RUNTIME_DIR, FUNCTION_DIR)
+
+import mymodule
+import redis
+from change_detection import ChangeDetector
+from context import Context
+from redis_utils import fetch_data_from_redis
+from state import RedisStateBackend
+
+INPUT_KEY = "bench:restart:input"
+OUTPUT_KEY = "bench:restart:output"
+
+def run(raw_inputs, enabled):
+    changes = ChangeDetector(enabled)
+    context = types.SimpleNamespace(env={})
+    invocations = writes = 0
+    started = time.process_time()
+    for raw in raw_inputs:
+        if not changes.input_changed("metrics", raw):
+            continue
+        output = mymodule.handler(json.loads(raw), context)
+        invocations += 1
+        if changes.output_changed("output", json.dumps(output)):
+            writes += 1
+    return (time.process_time() - started) * 1e6 / len(raw_inputs), invocations, writes
+
+def start_runtime():
+    # What app.serve does before its first cycle, with the context snapshotted to Redis
+    backend = RedisStateBackend(BENCH_REDIS_HOST, BENCH_REDIS_PORT, f"{OUTPUT_KEY}-context", snapshot_period=0)
+    context = Context(host=BENCH_REDIS_HOST, port=BENCH_REDIS_PORT, input_key=INPUT_KEY, output_key=OUTPUT_KEY, state_backend=backend)
+    changes = ChangeDetector(True)
+    changes.restore_input(INPUT_KEY, context.input_fingerprint)
+    return context, changes
+
+def run_cycle(redis_client, context, changes):
+    # One poll cycle of app.serve, the output if the handler ran
+    data = fetch_data_from_redis(redis_client, INPUT_KEY, changes)
+    if data is None:
+        return None
+    output = mymodule.handler(data, context)
+    context.input_fingerprint = changes.last_input(INPUT_KEY)
+    context.save_state()
+    return output
+
+def check_restart(start):
+    redis_client = redis.Redis(host=BENCH_REDIS_HOST, port=BENCH_REDIS_PORT)
+    try:
+        redis_client.delete(INPUT_KEY, f"{OUTPUT_KEY}-context")
+    except redis.RedisError as e:
+        print(f"Restart check skipped, no redis-server at {BENCH_REDIS_HOST}:{BENCH_REDIS_PORT}: {e}")
+        return []
+    failures = []
+    context, changes = start_runtime()
+    for index, value in enumerate((10.0, 30.0)):
+        snapshot = make_metrics_snapshot(1, start + datetime.timedelta(seconds=5 * index))
+        snapshot["cpu_percent-0"] = value
+        redis_client.set(INPUT_KEY, json.dumps(snapshot))
+        run_cycle(redis_client, context, changes)
+    # The restarted runtime reads the same last input again
+    context, changes = start_runtime()
+    if run_cycle(redis_client, context, changes) is not None:
+        failures.append("the last input before the restart was processed again")
+    snapshot["cpu_percent-0"] = 20.0
+    snapshot["timestamp"] = (start + datetime.timedelta(seconds=10)).isoformat()
+    redis_client.set(INPUT_KEY, json.dumps(snapshot))
+    output = run_cycle(redis_client, context, changes)
+    if output is None or output["avg-util-cpu0-60sec"] != 20.0:
+        failures.append(f"60s average after the restart is {output and output['avg-util-cpu0-60sec']}, expected 20.0")
+    redis_client.delete(INPUT_KEY, f"{OUTPUT_KEY}-context")
+    return failures
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cores", type=int, default=64)
+    parser.add_argument("--cycles", type=int, default=5000)
+    args = parser.parse_args()
+
+    quiet_logging()
+    start = datetime.datetime(2024, 1, 1)
+    failures = check_restart(start)
+    if failures:
+        sys.exit(f"Change detection across a restart: {', '.join(failures)}")
+    print(f"{'polls/publish':>13} {'mode':<8} {'us/cycle':>9} {'invocations':>11} {'writes':>7}")
+    for polls_per_publish in (1, 2, 5):
+        # The same snapshot is read polls_per_publish times in a row
+        raw_inputs = []
+        for cycle in range(args.cycles):
+            if cycle % polls_per_publish == 0:
+                raw = json.dumps(make_metrics_snapshot(args.cores, start + datetime.timedelta(seconds=5 * cycle)))
+            raw_inputs.append(raw)
+        for name, enabled in (("always", False), ("skip", True)):
+            cost, invocations, writes = run(raw_inputs, enabled)
+            print(f"{polls_per_publish:>13} {name:<8} {cost:>9.1f} {invocations:>11} {writes:>7}")
@@ -0,0 +1,80 @@
+"""Per-invocation cost of the NumPy columnar moving average against the per-key SlidingWindow.
+
+Before timing, the columnar outputs are checked against handler on inputs whose layout changes: same key count
+with a non-CPU key swapped for a new CPU, and CPUs missing from random snapshots (same keys, values equal up to
+float rounding). The timed runs then compare full, fixed layouts, where the outputs must be identical.
+
+Usage: python benchmarks/bench_columnar_window.py [--interval 1] [--invocations 1000]
+"""
+import argparse
+import datetime
+import math
+import random
+import sys
+import time
+import types
+
+from common import FUNCTION_DIR, add_to_path, make_metrics_snapshot, quiet_logging
+
+add_to_path(FUNCTION_DIR)
+
+import mymodule
+
+def run(function, snapshots):
+    context = types.SimpleNamespace(env={})
+    results = []
+    started = time.perf_counter()
+    for snapshot in snapshots:
+        results.append(function(snapshot, context))
+    return (time.perf_counter() - started) / len(snapshots), results
+
+def same_outputs(expected, actual):
+    # Same keys, values equal up to float rounding
+    return all(
+        expected_output.keys() == actual_output.keys()
+        and all(math.isclose(expected_output[key], actual_output[key], rel_tol=1e-9, abs_tol=1e-9) for key in expected_output)
+        for expected_output, actual_output in zip(expected, actual)
+    )
+
+def check_changing_layouts(start):
+    failures = []
+    # A non-CPU key replaced by a new CPU, the input keeps the same number of keys
+    swapped = [
+        {"timestamp": start.isoformat(), "cpu_percent-0": 10.0, "foo": 1},
+        {"timestamp": (start + datetime.timedelta(seconds=5)).isoformat(), "cpu_percent-0": 20.0, "cpu_percent-1": 30.0},
+    ]
+    if run(mymodule.handler, swapped)[1] != run(mymodule.columnar_handler, swapped)[1]:
+        failures.append("new CPU replacing a non-CPU key")
+
+    # CPUs missing from random snapshots, and gaps longer than the window
+    random.seed(0)
+    snapshots = []
+    moment = start
+    for _ in range(2000):
+        moment += datetime.timedelta(seconds=random.choice([1, 5, 5, 5, 90]))
+        snapshot = make_metrics_snapshot(16, moment)
+        for core in random.sample(range(16), random.randint(0, 8)):
+            del snapshot[f"cpu_percent-{core}"]
+        snapshots.append(snapshot)
+    if not same_outputs(run(mymodule.handler, snapshots)[1], run(mymodule.columnar_handler, snapshots)[1]):
+        failures.append("CPUs missing from some snapshots")
+    return failures
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between samples")
+    parser.add_argument("--invocations", type=int, default=1000)
+    args = parser.parse_args()
+
+    quiet_logging()
+    start = datetime.datetime(2025, 1, 1)
+    failures = check_changing_layouts(start)
+    if failures:
+        sys.exit(f"columnar_handler doesn't match handler: {', '.join(failures)}")
+    print(f"{'cores':>6} {'per-key (us)':>14} {'columnar (us)':>14} {'speedup':>8} {'identical':>10}")
+    for cores in (4, 8, 16, 32, 64, 128, 256):
+        snapshots = [make_metrics_snapshot(cores, start + datetime.timedelta(seconds=i * args.interval)) for i in range(args.invocations)]
+        per_key_cost, per_key_results = run(mymodule.handler, snapshots)
+        columnar_cost, columnar_results = run(mymodule.columnar_handler, snapshots)
+        identical = per_key_results == columnar_results
+        print(f"{cores:>6} {per_key_cost * 1e6:>14.1f} {columnar_cost * 1e6:>14.1f} {per_key_cost / columnar_cost:>7.1f}x {str(identical):>10}")
@@ -0,0 +1,42 @@
+"""Line chart build time and serialized figure size with and without decimation.
+
+Usage: python benchmarks/bench_dashboard_figure.py [--max-points 300] [--repeat 3]
+"""
+import argparse
+import datetime
+import random
+import time
+
+from common import DASHBOARD_DIR, add_to_path
+
+add_to_path(DASHBOARD_DIR)
+
+# Creating the Redis client doesn't connect, nothing else in the dashboard module touches Redis at import
+from app import build_line_chart
+
+def make_history(cores, points):
+    start = datetime.datetime(2024, 1, 1)
+    times = [start + datetime.timedelta(seconds=5 * index) for index in range(points)]
+    return {f"cpu{core}": [(timestamp, random.uniform(0, 100)) for timestamp in times] for core in range(cores)}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--max-points", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'cores':>5} {'points':>6} {'method':<7} {'trace':<10} {'build (ms)':>10} {'to_json (ms)':>12} {'size (KB)':>10}")
+    for cores in (8, 64, 256):
+        for points in (180, 720, 4320):
+            history = make_history(cores, points)
+            for method in ("none", "minmax", "lttb"):
+                build_times, json_times = [], []
+                for _ in range(args.repeat):
+                    started = time.perf_counter()
+                    fig = build_line_chart(history, args.max_points, method)
+                    build_times.append(time.perf_counter() - started)
+                    started = time.perf_counter()
+                    payload = fig.to_json()
+                    json_times.append(time.perf_counter() - started)
+                trace = type(fig.data[0]).__name__
+                print(f"{cores:>5} {points:>6} {method:<7} {trace:<10} {min(build_times) * 1000:>10.1f} {min(json_times) * 1000:>12.1f} {len(payload) / 1024:>10.0f}")
@@ -0,0 +1,93 @@
+"""Load test of the dashboard: N viewers polling the update callback, like open browser tabs do.
+
+Start the dashboard first (e.g. WEB_CONCURRENCY=4 gunicorn --threads 4 -b :8501 app:server in task2/), once with
+the default DASHBOARD_CACHE_TTL and once with DASHBOARD_CACHE_TTL=0. Unless --no-publish is given, outputs are
+published like the runtime does (SET + history XADD) every --publish-period seconds.
+
+Usage: python benchmarks/bench_dashboard_viewers.py [--url http://localhost:8501] [--viewers 50] [--duration 30]
+"""
+import argparse
+import json
+import threading
+import time
+import requests
+
+from common import make_metrics_snapshot, connect_redis, percentile
+
+def get_update_request(url):
+    # Body Dash sends when the interval fires, built from the app's callback map
+    for dependency in requests.get(f"{url}/_dash-dependencies").json():
+        if any(item["id"] == "interval-component" for item in dependency["inputs"]):
+            outputs = [
+                {"id": output.rsplit(".", 1)[0], "property": output.rsplit(".", 1)[1]}
+                for output in dependency["output"].strip(".").split("...")
+            ]
+            return {
+                "output": dependency["output"],
+                "outputs": outputs,
+                "inputs": [{"id": "interval-component", "property": "n_intervals", "value": 1}],
+                "changedPropIds": ["interval-component.n_intervals"],
+                "state": [],
+            }
+    raise SystemExit("No callback triggered by interval-component")
+
+def make_output(cores):
+    snapshot = make_metrics_snapshot(cores)
+    output = {f"avg-util-cpu{core}-60sec": snapshot[f"cpu_percent-{core}"] for core in range(cores)}
+    output.update({"percent-network-egress": 12.5, "percent-memory-cache": 40.0})
+    return output
+
+def publish(output_key, cores, period, stop):
+    redis_client = connect_redis()
+    while not stop.is_set():
+        payload = json.dumps(make_output(cores))
+        pipeline = redis_client.pipeline(transaction=False)
+        pipeline.set(output_key, payload)
+        pipeline.xadd(f"{output_key}-history", {"data": payload}, maxlen=17280, approximate=True)
+        pipeline.execute()
+        stop.wait(period)
+
+def viewer(url, body, interval, deadline, latencies, errors):
+    session = requests.Session()
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        try:
+            session.post(f"{url}/_dash-update-component", json=body, timeout=30).raise_for_status()
+            latencies.append((time.perf_counter() - started) * 1000)
+        except requests.RequestException:
+            errors.append(1)
+        time.sleep(max(0.0, interval - (time.perf_counter() - started)))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8501")
+    parser.add_argument("--viewers", type=int, default=50)
+    parser.add_argument("--interval", type=float, default=5.0, help="seconds between two updates of a viewer")
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--output-key", default="jeanevangelista-proj3-output")
+    parser.add_argument("--cores", type=int, default=64)
+    parser.add_argument("--publish-period", type=float, default=5.0)
+    parser.add_argument("--no-publish", action="store_true")
+    args = parser.parse_args()
+
+    body = get_update_request(args.url)
+    stop = threading.Event()
+    if not args.no_publish:
+        threading.Thread(target=publish, args=(args.output_key, args.cores, args.publish_period, stop), daemon=True).start()
+        time.sleep(0.5)
+
+    latencies, errors = [], []
+    deadline = time.monotonic() + args.duration
+    # Viewers are spread over the interval, like tabs opened at different times
+    threads = []
+    for index in range(args.viewers):
+        thread = threading.Thread(target=viewer, args=(args.url, body, args.interval, deadline, latencies, errors))
+        thread.start()
+        threads.append(thread)
+        time.sleep(args.interval / args.viewers)
+    for thread in threads:
+        thread.join()
+    stop.set()
+
+    print(f"viewers {args.viewers}, updates {len(latencies)} ({len(latencies) / args.duration:.1f}/s), errors {len(errors)}")
+    print(f"latency p50 {percentile(latencies, 50):.1f} ms, p99 {percentile(latencies, 99):.1f} ms")
@@ -0,0 +1,56 @@
+"""Per-invocation latency of the user function run in-process vs in the isolated worker pool.
+
+The isolated path pays for pickling the input and the output across a pipe, plus sending context.env back
+to the runtime every ISOLATION_ENV_SYNC invocations (the window state grows with the number of cores).
+Contexts are sticky, so the env only goes to a worker once.
+
+Usage: python benchmarks/bench_isolation.py [--invocations 2000] [--keys 4] [--workers 2] [--env-sync 10]
+"""
+import argparse
+import datetime
+import statistics
+import time
+
+from common import RUNTIME_DIR, FUNCTION_DIR, add_to_path, make_metrics_snapshot, percentile, quiet_logging
+
+add_to_path(RUNTIME_DIR, FUNCTION_DIR)
+
+import mymodule
+from context import Context
+from isolation import IsolatedHandler
+
+def run(handler, inputs, contexts):
+    latencies = []
+    started = time.process_time()
+    for index, data in enumerate(inputs):
+        call_started = time.perf_counter()
+        handler(data, contexts[index % len(contexts)])
+        latencies.append((time.perf_counter() - call_started) * 1e6)
+    return latencies, (time.process_time() - started) * 1e6 / len(inputs)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--invocations", type=int, default=2000)
+    parser.add_argument("--keys", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--env-sync", type=int, default=10)
+    args = parser.parse_args()
+
+    quiet_logging()
+    start = datetime.datetime(2024, 1, 1)
+    modes = {"in-process": None, "sync=1": 1, f"sync={args.env_sync}": args.env_sync}
+    print(f"{'cores':>5} {'mode':<10} {'p50 (us)':>9} {'p99 (us)':>9} {'mean (us)':>10} {'runtime CPU (us)':>17}")
+    for cores in (8, 64, 256):
+        inputs = [make_metrics_snapshot(cores, start + datetime.timedelta(seconds=5 * i)) for i in range(args.invocations)]
+        for name, env_sync in modes.items():
+            contexts = [Context("localhost", 6379, f"metrics-{key}", f"output-{key}") for key in range(args.keys)]
+            handler = mymodule.handler
+            if env_sync:
+                handler = IsolatedHandler(mymodule.handler, pool_size=args.workers, timeout=10, max_invocations=0, env_sync=env_sync)
+            # Warm up: the first invocation of each context ships its env to the worker
+            run(handler, inputs[:args.keys], contexts)
+            latencies, cpu = run(handler, inputs, contexts)
+            if env_sync:
+                handler.close()
+            print(f"{cores:>5} {name:<10} {percentile(latencies, 50):>9.1f} {percentile(latencies, 99):>9.1f} "
+                  f"{statistics.mean(latencies):>10.1f} {cpu:>17.1f}")
@@ -0,0 +1,50 @@
+"""Round trips and latency per runtime cycle: one GET/SET per key against batched MGET/MSET.
+
+Usage: python benchmarks/bench_redis_io.py [--cycles 200] [--cores 16]
+"""
+import argparse
+import json
+import os
+import time
+
+from common import RUNTIME_DIR, BENCH_REDIS_HOST, BENCH_REDIS_PORT, add_to_path, connect_redis, make_metrics_snapshot, percentile, quiet_logging
+
+os.environ.update({"REDIS_HOST": BENCH_REDIS_HOST, "REDIS_PORT": str(BENCH_REDIS_PORT), "REDIS_INPUT_KEY": "bench:io"})
+add_to_path(RUNTIME_DIR)
+
+from redis_utils import initialize_redis_client, fetch_data_from_redis, store_data_in_redis, fetch_many_from_redis, store_many_in_redis
+
+def per_key_cycle(redis_client, keys):
+    for key in keys:
+        data = fetch_data_from_redis(redis_client, key)
+        store_data_in_redis(redis_client, f"{key}:output", data)
+
+def batched_cycle(redis_client, keys):
+    inputs = fetch_many_from_redis(redis_client, keys)
+    store_many_in_redis(redis_client, {f"{key}:output": data for key, data in inputs.items()})
+
+def measure(cycle, redis_client, keys, cycles):
+    latencies = []
+    for _ in range(cycles):
+        started = time.perf_counter()
+        cycle(redis_client, keys)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cycles", type=int, default=200)
+    parser.add_argument("--cores", type=int, default=16)
+    args = parser.parse_args()
+
+    quiet_logging()
+    seed_client = connect_redis()
+    redis_client = initialize_redis_client()
+
+    print(f"{'keys':>5} {'mode':<9} {'round trips':>11} {'p50 (ms)':>9} {'p99 (ms)':>9}")
+    for key_count in (1, 10, 100, 500):
+        keys = [f"bench:io:input:{index}" for index in range(key_count)]
+        seed_client.mset({key: json.dumps(make_metrics_snapshot(args.cores)) for key in keys})
+        for name, cycle, round_trips in (("per-key", per_key_cycle, 2 * key_count), ("batched", batched_cycle, 2)):
+            latencies = measure(cycle, redis_client, keys, args.cycles)
+            print(f"{key_count:>5} {name:<9} {round_trips:>11} {percentile(latencies, 50):>9.2f} {percentile(latencies, 99):>9.2f}")
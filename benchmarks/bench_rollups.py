@@ -0,0 +1,116 @@
+"""Latency and memory of the 5m/1h CPU aggregates (average, min, max): bucketed rollups vs keeping the raw samples
+of every window.
+
+raw keeps one SlidingWindow per core and window (the 1 h window alone holds 720 samples per core at 5 s),
+rollup keeps one RollupWindow per core (ROLLUP_BUCKETS buckets per window). Both are measured once every
+window is full; memory is what context.env holds (tracemalloc) and its pickled size (a state snapshot).
+
+Before timing, the (average, min, max) of every window of RollupWindow, the 1 minute one included, are checked
+against a brute force over the raw samples of the same bucket-aligned window, with irregular sampling intervals.
+
+Usage: python benchmarks/bench_rollups.py [--hours 2] [--interval 5]
+"""
+import argparse
+import datetime
+import math
+import pickle
+import random
+import sys
+import time
+import tracemalloc
+import types
+
+from common import FUNCTION_DIR, add_to_path, percentile, quiet_logging
+from generator import generate_snapshots
+
+add_to_path(FUNCTION_DIR)
+
+import mymodule
+
+def raw_averages(input, context):
+    result = {}
+    measurement_datetime = mymodule.get_measurement_datetime(input)
+    windows = context.env.setdefault("cpu_raw_windows", {})
+    for key, value in input.items():
+        if key.startswith("cpu_percent-"):
+            _, cpu_number = key.split("-", 1)
+            for window_length in mymodule.ROLLUP_WINDOWS:
+                # Same keys as get_rollup_aggregates, the 60 s window comes from handler in both cases
+                if window_length == mymodule.MOVING_AVERAGE_WINDOW:
+                    continue
+                window = windows.get((key, window_length))
+                if window is None:
+                    window = windows[(key, window_length)] = mymodule.SlidingWindow(window_length)
+                window.push(measurement_datetime, value)
+                window_name = f"{int(window_length.total_seconds())}sec"
+                result[f"avg-util-cpu{cpu_number}-{window_name}"] = window.average
+                result[f"min-util-cpu{cpu_number}-{window_name}"] = window.min
+                result[f"max-util-cpu{cpu_number}-{window_name}"] = window.max
+    return result
+
+def check_rollups(samples=20000, seed=0):
+    # A window of tier i holds the samples whose bucket of that tier starts at most ROLLUP_BUCKETS - 1 buckets
+    # before the bucket of the last sample
+    random.seed(seed)
+    rollup = mymodule.RollupWindow()
+    bucket_lengths = [int(window.total_seconds()) // mymodule.ROLLUP_BUCKETS for window in mymodule.ROLLUP_WINDOWS]
+    history = []
+    seconds = 1_700_000_000.0
+    failures = []
+    for index in range(samples):
+        seconds += random.choice([1, 2, 5, 5, 5, 7, 30, 400])
+        value = round(random.uniform(0, 100), 1)
+        history.append((seconds, value))
+        rollup.push(mymodule.EPOCH + datetime.timedelta(seconds=seconds), value)
+        for bucket_length, window, (average, low, high) in zip(bucket_lengths, mymodule.ROLLUP_WINDOWS, rollup.aggregates()):
+            cutoff = seconds - seconds % bucket_length - (mymodule.ROLLUP_BUCKETS - 1) * bucket_length
+            values = [sample for time_, sample in history if time_ - time_ % bucket_length >= cutoff]
+            if not (math.isclose(average, sum(values) / len(values), abs_tol=1e-6) and low == min(values) and high == max(values)):
+                failures.append(f"{window} window after {index + 1} samples")
+        # Older samples can't be in any window anymore
+        while history and history[0][0] < seconds - 2 * max(mymodule.ROLLUP_WINDOWS).total_seconds():
+            history.pop(0)
+    return failures[:5]
+
+def run(function, inputs, warmup):
+    context = types.SimpleNamespace(env={})
+    for data in inputs[:warmup]:
+        function(data, context)
+    latencies = []
+    for data in inputs[warmup:]:
+        started = time.perf_counter()
+        function(data, context)
+        latencies.append((time.perf_counter() - started) * 1e6)
+    return latencies, len(pickle.dumps(context.env))
+
+def measure_memory(function, inputs):
+    # Separate pass, tracemalloc slows every allocation down
+    context = types.SimpleNamespace(env={})
+    tracemalloc.start()
+    for data in inputs:
+        function(data, context)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return memory
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--hours", type=float, default=2.0)
+    parser.add_argument("--interval", type=float, default=5.0)
+    args = parser.parse_args()
+
+    quiet_logging()
+    failures = check_rollups()
+    if failures:
+        sys.exit(f"RollupWindow doesn't match the raw samples: {', '.join(failures)}")
+    invocations = int(args.hours * 3600 / args.interval)
+    # Every window is full after the longest one
+    warmup = int(max(mymodule.ROLLUP_WINDOWS).total_seconds() / args.interval)
+    print(f"{'cores':>5} {'mode':<7} {'p50 (us)':>9} {'p99 (us)':>9} {'env (KB)':>9} {'pickled (KB)':>12}")
+    for cores in (8, 64):
+        inputs = generate_snapshots(cores, invocations, args.interval)
+        for name, function in (("raw", raw_averages), ("rollup", mymodule.get_rollup_aggregates)):
+            latencies, pickled = run(function, inputs, warmup)
+            memory = measure_memory(function, inputs)
+            print(f"{cores:>5} {name:<7} {percentile(latencies, 50):>9.1f} {percentile(latencies, 99):>9.1f} "
+                  f"{memory / 1024:>9.1f} {pickled / 1024:>12.1f}")
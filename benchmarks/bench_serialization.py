@@ -0,0 +1,65 @@
+"""Encode/decode cost and size of the payload codecs, for 'metrics' inputs and handler outputs of 4 to 512 cores.
+
+Before timing, payloads only the json module accepts (NaN, Infinity, integers wider than 64 bits) are checked to
+decode through the runtime's decode_payload with the default settings (PAYLOAD_CODEC unset).
+
+Usage: python benchmarks/bench_serialization.py [--repeat 2000]
+"""
+import argparse
+import math
+import os
+import sys
+import time
+
+from common import RUNTIME_DIR, add_to_path, make_metrics_snapshot
+
+os.environ.pop("PAYLOAD_CODEC", None)
+add_to_path(RUNTIME_DIR)
+
+from serialization import DECODE_ERRORS, JsonCodec, OrjsonCodec, MsgpackCodec, decode_payload, orjson, msgpack
+
+def check_default_decoding():
+    failures = []
+    for raw, check in ((b'{"avg-util-cpu0-60sec": NaN}', lambda data: math.isnan(data["avg-util-cpu0-60sec"])),
+                       (b'{"value": Infinity}', lambda data: data["value"] == math.inf),
+                       (b'{"bytes": 123456789012345678901234567890}', lambda data: data["bytes"] == 123456789012345678901234567890)):
+        try:
+            if not check(decode_payload(raw)):
+                failures.append(f"{raw!r} decoded to a different value")
+        except DECODE_ERRORS as e:
+            failures.append(f"{raw!r} failed: {e}")
+    return failures
+
+def make_output(cores):
+    output = {f"avg-util-cpu{core}-60sec": 12.3456789 + core for core in range(cores)}
+    output.update({"percent-network-egress": 42.0, "percent-memory-cache": 17.5})
+    return output
+
+def measure(function, value, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function(value)
+    return (time.perf_counter() - started) * 1e6 / repeat
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    failures = check_default_decoding()
+    if failures:
+        sys.exit(f"JSON payloads the default codec must accept: {', '.join(failures)}")
+    codecs = [JsonCodec()]
+    if orjson is not None:
+        codecs.append(OrjsonCodec())
+    if msgpack is not None:
+        codecs.append(MsgpackCodec())
+
+    print(f"{'cores':>5} {'payload':<7} {'codec':<8} {'bytes':>7} {'encode (us)':>11} {'decode (us)':>11}")
+    for cores in (4, 16, 64, 128, 256, 512):
+        for name, payload in (("input", make_metrics_snapshot(cores)), ("output", make_output(cores))):
+            for codec in codecs:
+                encoded = codec.encode(payload)
+                encode_cost = measure(codec.encode, payload, args.repeat)
+                decode_cost = measure(codec.decode, encoded, args.repeat)
+                print(f"{cores:>5} {name:<7} {codec.name:<8} {len(encoded):>7} {encode_cost:>11.1f} {decode_cost:>11.1f}")
@@ -0,0 +1,67 @@
+"""Handler throughput of the sharded runtime for several replica x worker layouts against a local redis-server.
+
+Every replica and worker runs as a local process with its own shard of the input keys.
+
+Usage: python benchmarks/bench_sharding_throughput.py [--keys 200] [--cores 16] [--duration 5]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import time
+
+from common import FUNCTION_DIR, RUNTIME_DIR, BENCH_REDIS_HOST, BENCH_REDIS_PORT, add_to_path, connect_redis, make_metrics_snapshot, quiet_logging
+
+os.environ.update({
+    "REDIS_HOST": BENCH_REDIS_HOST,
+    "REDIS_PORT": str(BENCH_REDIS_PORT),
+    "REDIS_INPUT_PATTERN": "bench:shard:input:*",
+    "REDIS_OUTPUT_KEY": "bench:shard:output:{key}",
+    "KEY_DISCOVERY_PERIOD": "3600",
+})
+add_to_path(RUNTIME_DIR, FUNCTION_DIR)
+
+import mymodule
+from sharding import run_worker
+from reloader import HandlerReloader
+
+def measure(replicas, workers, duration):
+    invocations = multiprocessing.Value("l", 0)
+
+    def counting_handler(input, context):
+        with invocations.get_lock():
+            invocations.value += 1
+        return mymodule.handler(input, context)
+
+    ctx = multiprocessing.get_context("fork")
+    processes = [
+        ctx.Process(target=run_worker, args=(HandlerReloader(counting_handler, (None, None)), replica, replicas, worker, workers, 0), daemon=True)
+        for replica in range(replicas) for worker in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    time.sleep(duration)
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.join()
+    return invocations.value / duration
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--keys", type=int, default=200)
+    parser.add_argument("--cores", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=5.0)
+    args = parser.parse_args()
+
+    quiet_logging()
+    redis_client = connect_redis()
+    for key in redis_client.scan_iter(match="bench:shard:*"):
+        redis_client.delete(key)
+    for index in range(args.keys):
+        redis_client.set(f"bench:shard:input:{index}", json.dumps(make_metrics_snapshot(args.cores)))
+
+    print(f"{'replicas':>8} {'workers':>8} {'invocations/s':>14}")
+    for replicas, workers in ((1, 1), (1, 2), (1, 4), (2, 1), (2, 2), (4, 1), (4, 2)):
+        throughput = measure(replicas, workers, args.duration)
+        print(f"{replicas:>8} {workers:>8} {throughput:>14.1f}")
@@ -0,0 +1,56 @@
+"""Cost per invocation of the SlidingWindow moving average against the previous list rebuild.
+
+Usage: python benchmarks/bench_sliding_window.py [--cores 128] [--interval 0.5] [--invocations 2000]
+"""
+import argparse
+import datetime
+import time
+import types
+
+from common import FUNCTION_DIR, add_to_path, make_metrics_snapshot, quiet_logging
+
+add_to_path(FUNCTION_DIR)
+
+import mymodule
+
+def list_rebuild_moving_average(input, context):
+    # Previous implementation: filter a new list per key and re-sum it on every invocation
+    result = {}
+    measurement_datetime = mymodule.get_measurement_datetime(input)
+    cutoff_datetime = measurement_datetime - datetime.timedelta(seconds=60)
+    cpu_history = context.env.setdefault("cpu_history", {})
+    for key in input.keys():
+        if key.startswith('cpu_percent-'):
+            history_list = [sample for sample in cpu_history.get(key, []) if sample[0] >= cutoff_datetime]
+            history_list.append((measurement_datetime, input.get(key, 0.0)))
+            cpu_history[key] = history_list
+            _, cpu_number = key.split("-", 1)
+            result[f'avg-util-cpu{cpu_number}-60sec'] = sum(value for _, value in history_list) / len(history_list)
+    return result
+
+def run(function, snapshots):
+    context = types.SimpleNamespace(env={})
+    started = time.perf_counter()
+    for snapshot in snapshots:
+        result = function(snapshot, context)
+    return (time.perf_counter() - started) / len(snapshots), result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cores", type=int, default=128)
+    parser.add_argument("--interval", type=float, default=0.5, help="seconds between samples")
+    parser.add_argument("--invocations", type=int, default=2000)
+    args = parser.parse_args()
+
+    quiet_logging()
+    start = datetime.datetime(2025, 1, 1)
+    snapshots = [make_metrics_snapshot(args.cores, start + datetime.timedelta(seconds=i * args.interval)) for i in range(args.invocations)]
+
+    list_cost, list_result = run(list_rebuild_moving_average, snapshots)
+    window_cost, window_result = run(mymodule.get_moving_average, snapshots)
+    max_error = max(abs(list_result[k] - window_result[k]) for k in list_result)
+
+    print(f"cores={args.cores} samples/window={int(60 / args.interval) + 1} invocations={args.invocations}")
+    print(f"list rebuild   : {list_cost * 1e6:10.1f} us/invocation")
+    print(f"sliding window : {window_cost * 1e6:10.1f} us/invocation ({list_cost / window_cost:.1f}x)")
+    print(f"max abs difference between both averages: {max_error:.2e}")
@@ -0,0 +1,67 @@
+"""End-to-end input -> output latency of the runtime trigger modes against a local redis-server.
+
+Usage: python benchmarks/bench_trigger_latency.py [--samples 20] [--period 1]
+"""
+import argparse
+import json
+import threading
+import time
+
+from common import RUNTIME_DIR, add_to_path, connect_redis, percentile, quiet_logging
+
+add_to_path(RUNTIME_DIR)
+
+from context import Context
+from handler import execute_handler
+from redis_utils import store_data_in_redis
+from triggers import get_inputs
+
+def echo_handler(input, context):
+    return {"seq": input["seq"]}
+
+def run_runtime(redis_client, mode, period, input_key, output_key):
+    context = Context(host=None, port=None, input_key=input_key, output_key=output_key)
+    for data in get_inputs(redis_client, input_key, mode=mode, period=period):
+        output = execute_handler(echo_handler, data, context)
+        if output:
+            store_data_in_redis(redis_client, output_key, output)
+
+def publish(redis_client, mode, key, payload):
+    if mode == "stream":
+        redis_client.xadd(key, {"data": payload})
+    else:
+        redis_client.set(key, payload)
+
+def measure(redis_client, mode, samples, period):
+    input_key = f"bench:trigger:{mode}:input"
+    output_key = f"bench:trigger:{mode}:output"
+    redis_client.delete(input_key, output_key)
+    threading.Thread(target=run_runtime, args=(redis_client, mode, period, input_key, output_key), daemon=True).start()
+    time.sleep(0.5)
+
+    latencies = []
+    for seq in range(samples):
+        started = time.perf_counter()
+        publish(redis_client, mode, input_key, json.dumps({"seq": seq}))
+        while True:
+            output = redis_client.get(output_key)
+            if output and json.loads(output)["seq"] == seq:
+                break
+            time.sleep(0.001)
+        latencies.append((time.perf_counter() - started) * 1000)
+        # Desynchronize from the polling period so poll latency is sampled over the whole interval
+        time.sleep(period * 0.37)
+    return latencies
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--samples", type=int, default=20)
+    parser.add_argument("--period", type=int, default=1, help="REDIS_MONITORING_PERIOD used by the poll mode (s)")
+    args = parser.parse_args()
+
+    quiet_logging()
+    redis_client = connect_redis()
+    print(f"{'mode':<10} {'p50 (ms)':>10} {'p99 (ms)':>10} {'max (ms)':>10}")
+    for mode in ("poll", "keyspace", "stream"):
+        latencies = measure(redis_client, mode, args.samples, args.period)
+        print(f"{mode:<10} {percentile(latencies, 50):>10.2f} {percentile(latencies, 99):>10.2f} {max(latencies):>10.2f}")
@@ -0,0 +1,109 @@
+"""Function load time and peak RSS when loading a ZIP-packaged function from a local HTTP server.
+
+Each scenario runs in a fresh interpreter, like a pod start:
+- legacy: previous behaviour (whole archive in memory, new temp dir, import every module until the handler is found)
+- cold: empty cache, streamed download into the content-addressed cache (+ bytecode compilation)
+- warm: cache populated, conditional GET answered with 304
+- warm+manifest: same, with a manifest.json naming the handler module
+
+Usage: python benchmarks/bench_zip_cold_start.py [--modules 200] [--padding-kb 256] [--runs 5]
+"""
+import argparse
+import functools
+import http.server
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import zipfile
+
+from common import FUNCTION_DIR, RUNTIME_DIR
+
+STARTUP_SCRIPT = """
+import importlib, os, resource, sys, tempfile, time, zipfile, requests
+sys.path.insert(0, {runtime_dir!r})
+from handler import download_and_extract_zip, dynamic_import_from_dir
+# Only the function loading is timed, the runtime's own imports are the same in every scenario
+started = time.perf_counter()
+if {legacy!r}:
+    response = requests.get({url!r}, stream=True)
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".zip") as temp_zip:
+        temp_zip.write(response.content)
+    extracted_dir = tempfile.mkdtemp()
+    with zipfile.ZipFile(temp_zip.name) as zip_ref:
+        zip_ref.extractall(extracted_dir)
+    os.unlink(temp_zip.name)
+    sys.path.insert(0, extracted_dir)
+    handler = None
+    for root, _, files in os.walk(extracted_dir):
+        for file in sorted(files):
+            if file.endswith(".py") and handler is None:
+                handler = getattr(importlib.import_module(file[:-3]), "handler", None)
+else:
+    handler = dynamic_import_from_dir(download_and_extract_zip({url!r}, {cache_dir!r}), "handler")
+assert handler is not None
+print(time.perf_counter() - started, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+def build_archive(path, modules, padding_kb, with_manifest):
+    # Filler modules are named so that a tree walk reaches them before the real handler module
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for index in range(modules):
+            archive.writestr(f"aaa_helper_{index}.py", f"VALUE = {index}\n" + "def f(x):\n    return x * 2\n" * 20)
+        archive.write(os.path.join(FUNCTION_DIR, "mymodule.py"), "zzz_function.py")
+        archive.writestr("assets/blob.bin", os.urandom(padding_kb * 1024))
+        if with_manifest:
+            archive.writestr("manifest.json", json.dumps({"module": "zzz_function", "handler": "handler"}))
+
+def run_startup(url, cache_dir, legacy=False):
+    script = STARTUP_SCRIPT.format(runtime_dir=RUNTIME_DIR, url=url, cache_dir=cache_dir, legacy=legacy)
+    env = dict(os.environ, METRICS_PORT="0")
+    output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, env=env, check=True).stdout
+    elapsed, max_rss_kb = output.split()
+    return float(elapsed), int(max_rss_kb)
+
+def report(name, results):
+    times = [elapsed * 1000 for elapsed, _ in results]
+    rss = max(max_rss for _, max_rss in results) / 1024
+    print(f"{name:<15} {statistics.median(times):>10.1f} {rss:>14.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modules", type=int, default=200)
+    parser.add_argument("--padding-kb", type=int, default=256)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    serve_dir = tempfile.mkdtemp()
+    build_archive(os.path.join(serve_dir, "function.zip"), args.modules, args.padding_kb, with_manifest=False)
+    build_archive(os.path.join(serve_dir, "function-manifest.zip"), args.modules, args.padding_kb, with_manifest=True)
+
+    # SimpleHTTPRequestHandler answers If-Modified-Since with 304
+    request_handler = functools.partial(http.server.SimpleHTTPRequestHandler, directory=serve_dir)
+    http.server.SimpleHTTPRequestHandler.log_message = lambda *args: None
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), request_handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    print(f"{'scenario':<15} {'median (ms)':>10} {'peak RSS (MB)':>14}")
+    report("legacy", [run_startup(f"{base_url}/function.zip", None, legacy=True) for _ in range(args.runs)])
+
+    cold = []
+    for _ in range(args.runs):
+        cache_dir = tempfile.mkdtemp()
+        cold.append(run_startup(f"{base_url}/function.zip", cache_dir))
+        shutil.rmtree(cache_dir)
+    report("cold", cold)
+
+    for name, archive in (("warm", "function.zip"), ("warm+manifest", "function-manifest.zip")):
+        cache_dir = tempfile.mkdtemp()
+        run_startup(f"{base_url}/{archive}", cache_dir)
+        report(name, [run_startup(f"{base_url}/{archive}", cache_dir) for _ in range(args.runs)])
+        shutil.rmtree(cache_dir)
+
+    server.shutdown()
+    shutil.rmtree(serve_dir)
@@ -0,0 +1,52 @@
+import os
+import sys
+import datetime
+import random
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUNTIME_DIR = os.path.join(ROOT_DIR, "task3", "app")
+FUNCTION_DIR = os.path.join(ROOT_DIR, "task1")
+DASHBOARD_DIR = os.path.join(ROOT_DIR, "task2")
+
+BENCH_REDIS_HOST = os.getenv("BENCH_REDIS_HOST", "localhost")
+BENCH_REDIS_PORT = int(os.getenv("BENCH_REDIS_PORT", "6379"))
+
+def add_to_path(*directories):
+    for directory in directories:
+        if directory not in sys.path:
+            sys.path.insert(0, directory)
+
+def connect_redis(decode_responses=True):
+    import redis
+    client = redis.Redis(host=BENCH_REDIS_HOST, port=BENCH_REDIS_PORT, decode_responses=decode_responses)
+    try:
+        client.ping()
+    except redis.RedisError as e:
+        sys.exit(f"Could not reach redis-server at {BENCH_REDIS_HOST}:{BENCH_REDIS_PORT}: {e}")
+    return client
+
+def make_metrics_snapshot(cores, timestamp=None):
+    # Same key schema as the 'metrics' input published by the monitoring collector
+    timestamp = timestamp or datetime.datetime.now()
+    snapshot = {"timestamp": timestamp.isoformat()}
+    for core in range(cores):
+        snapshot[f"cpu_percent-{core}"] = round(random.uniform(0, 100), 1)
+    snapshot["net_io_counters_eth0-bytes_sent"] = random.randint(0, 10**9)
+    snapshot["net_io_counters_eth0-bytes_recv"] = random.randint(0, 10**9)
+    snapshot["virtual_memory-total"] = 16 * 1024**3
+    snapshot["virtual_memory-cached"] = random.randint(0, 4 * 1024**3)
+    snapshot["virtual_memory-buffers"] = random.randint(0, 1024**3)
+    return snapshot
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+def quiet_logging():
+    import logging
+    logging.getLogger().setLevel(logging.WARNING)
+    for name in list(logging.root.manager.loggerDict):
+        logging.getLogger(name).setLevel(logging.WARNING)
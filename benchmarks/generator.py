@@ -0,0 +1,56 @@
+"""Synthetic load for the runtime: metrics snapshots with the same key schema as the 'metrics' input.
+
+As a script it publishes snapshots to a local redis-server at a fixed rate, either as a SET of the input key (poll
+and keyspace triggers) or as stream entries (stream trigger):
+
+Usage: python benchmarks/generator.py [--key metrics] [--cores 8] [--rate 1] [--duration 60] [--mode set|stream]
+"""
+import argparse
+import datetime
+import json
+import random
+import time
+
+from common import connect_redis, make_metrics_snapshot
+
+def generate_snapshots(cores, count, interval=5.0, start=None, seed=0):
+    # Snapshots spaced `interval` seconds apart in measurement time, the same sequence for the same seed
+    random.seed(seed)
+    start = start or datetime.datetime(2024, 1, 1)
+    return [make_metrics_snapshot(cores, start + datetime.timedelta(seconds=interval * index)) for index in range(count)]
+
+def publish(redis_client, key, payload, mode="set", field="data"):
+    if mode == "stream":
+        return redis_client.xadd(key, {field: payload})
+    return redis_client.set(key, payload)
+
+def run_generator(redis_client, key, cores, rate, duration, mode="set", on_publish=None):
+    # Open loop: snapshots go out on schedule whether or not the runtime keeps up. Returns the publish times
+    interval = 1.0 / rate
+    publish_times = []
+    started = time.monotonic()
+    index = 0
+    while index * interval < duration:
+        delay = started + index * interval - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        payload = json.dumps(make_metrics_snapshot(cores))
+        publish_times.append(time.time())
+        publish(redis_client, key, payload, mode)
+        if on_publish:
+            on_publish(index)
+        index += 1
+    return publish_times
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--key", default="metrics")
+    parser.add_argument("--cores", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=1.0, help="snapshots per second")
+    parser.add_argument("--duration", type=float, default=60.0, help="seconds")
+    parser.add_argument("--mode", choices=("set", "stream"), default="set")
+    args = parser.parse_args()
+
+    redis_client = connect_redis()
+    published = run_generator(redis_client, args.key, args.cores, args.rate, args.duration, args.mode)
+    print(f"Published {len(published)} snapshots of {args.cores} cores to '{args.key}' ({args.mode})")
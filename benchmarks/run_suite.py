@@ -0,0 +1,255 @@
+"""Benchmark suite of the runtime -> Redis -> dashboard pipeline, with a JSON report to compare between commits.
+
+Scenarios (each one runs in a fresh interpreter, so peak RSS and CPU time are its own):
+- handler:<name>: mymodule.<name> driven in-process by the runtime (wrapping, execute_handler, output encoding)
+- pipeline: the runtime's serve loop with the stream trigger, fed by the generator at --rate snapshots/s;
+  latency is from the XADD of the input to the output entry in the history stream, CPU and RSS are the runtime's
+- dashboard: uncached dashboard view builds (history read + figures) over a history of --history outputs
+
+pipeline and dashboard need a local redis-server (BENCH_REDIS_HOST / BENCH_REDIS_PORT).
+
+Usage: python benchmarks/run_suite.py [--scenarios handler:handler,pipeline,...] [--cores 8] [--invocations 2000]
+                                      [--rate 20] [--duration 10] [--history 720] [--output report.json] [--compare old.json]
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+from common import BENCH_REDIS_HOST, BENCH_REDIS_PORT, DASHBOARD_DIR, FUNCTION_DIR, ROOT_DIR, RUNTIME_DIR, add_to_path, connect_redis, percentile, quiet_logging
+from generator import generate_snapshots, publish
+
+HANDLERS = ("handler", "columnar_handler", "rollup_handler", "percentages_handler")
+SCENARIOS = tuple(f"handler:{name}" for name in HANDLERS) + ("pipeline", "dashboard")
+
+INPUT_KEY = "bench:suite:input"
+OUTPUT_KEY = "bench:suite:output"
+DASHBOARD_KEY = "bench:suite:dashboard"
+
+def summarize(latencies, wall_seconds, cpu_seconds, peak_rss_kb, **extra):
+    invocations = len(latencies)
+    return {
+        "invocations": invocations,
+        "throughput_per_s": invocations / wall_seconds if wall_seconds else 0.0,
+        "latency_ms": {
+            "p50": percentile(latencies, 50),
+            "p99": percentile(latencies, 99),
+            "mean": statistics.mean(latencies) if latencies else 0.0,
+        },
+        "cpu_seconds": cpu_seconds,
+        "cpu_ms_per_invocation": cpu_seconds * 1000 / invocations if invocations else 0.0,
+        "peak_rss_mb": peak_rss_kb / 1024,
+        **extra,
+    }
+
+def run_handler(name, args):
+    os.environ.setdefault("METRICS_PORT", "0")
+    add_to_path(RUNTIME_DIR, FUNCTION_DIR)
+    import mymodule
+    from context import Context
+    from handler import execute_handler, wrap_handler
+    from redis_utils import encode_data
+    quiet_logging()
+
+    handler = wrap_handler(getattr(mymodule, name))
+    context = Context(host=None, port=None, input_key=INPUT_KEY, output_key=OUTPUT_KEY)
+    inputs = generate_snapshots(args.cores, args.invocations)
+    latencies = []
+    cpu_started = time.process_time()
+    started = time.perf_counter()
+    for data in inputs:
+        call_started = time.perf_counter()
+        encode_data(OUTPUT_KEY, execute_handler(handler, data, context))
+        latencies.append((time.perf_counter() - call_started) * 1000)
+    wall_seconds = time.perf_counter() - started
+    cpu_seconds = time.process_time() - cpu_started
+    return summarize(latencies, wall_seconds, cpu_seconds, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+def run_pipeline(args):
+    os.environ.update({
+        "REDIS_HOST": BENCH_REDIS_HOST,
+        "REDIS_PORT": str(BENCH_REDIS_PORT),
+        "REDIS_INPUT_KEY": INPUT_KEY,
+        "REDIS_OUTPUT_KEY": OUTPUT_KEY,
+        "REDIS_TRIGGER_MODE": "stream",
+        "METRICS_PORT": "0",
+    })
+    add_to_path(RUNTIME_DIR, FUNCTION_DIR)
+    import multiprocessing
+    import mymodule
+    from app import serve
+    from context import Context
+    from handler import wrap_handler
+    from redis_utils import get_history_key, initialize_redis_client
+    from reloader import HandlerReloader
+    quiet_logging()
+
+    redis_client = connect_redis(decode_responses=False)
+    history_key = get_history_key(OUTPUT_KEY)
+    redis_client.delete(INPUT_KEY, OUTPUT_KEY, history_key)
+
+    def run_runtime():
+        context = Context(host=BENCH_REDIS_HOST, port=BENCH_REDIS_PORT, input_key=INPUT_KEY, output_key=OUTPUT_KEY)
+        serve(initialize_redis_client(), HandlerReloader(wrap_handler(mymodule.handler), (None, None)), context)
+
+    process = multiprocessing.get_context("fork").Process(target=run_runtime, daemon=True)
+    process.start()
+    # The stream trigger only reads entries added after it started, wait for a first output
+    snapshots = generate_snapshots(args.cores, int(args.rate * args.duration) + 1)
+    deadline = time.monotonic() + 10
+    while not redis_client.exists(OUTPUT_KEY):
+        if time.monotonic() > deadline:
+            process.kill()
+            sys.exit("The runtime didn't produce any output")
+        publish(redis_client, INPUT_KEY, json.dumps(snapshots[0]), "stream")
+        time.sleep(0.1)
+    time.sleep(0.5)
+    redis_client.delete(history_key)
+
+    # Open loop at --rate, every input is a new snapshot so every one of them produces an output entry
+    publish_times = []
+    started = time.perf_counter()
+    for index, snapshot in enumerate(snapshots[1:]):
+        delay = started + index / args.rate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        entry_id = publish(redis_client, INPUT_KEY, json.dumps(snapshot), "stream")
+        publish_times.append(int(entry_id.split(b"-")[0]))
+    deadline = time.monotonic() + 10
+    while redis_client.xlen(history_key) < len(publish_times) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    wall_seconds = time.perf_counter() - started
+    process.terminate()
+    process.join()
+
+    # Both ids come from the Redis clock (ms), the n-th output belongs to the n-th input
+    output_times = [int(entry_id.split(b"-")[0]) for entry_id, _ in redis_client.xrange(history_key)]
+    latencies = [float(output - published) for published, output in zip(publish_times, output_times)]
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return summarize(latencies, wall_seconds, usage.ru_utime + usage.ru_stime, usage.ru_maxrss,
+                     published=len(publish_times), dropped=len(publish_times) - len(output_times))
+
+def run_dashboard(args):
+    os.environ.update({
+        "REDIS_HOST": BENCH_REDIS_HOST,
+        "REDIS_PORT": str(BENCH_REDIS_PORT),
+        "REDIS_OUTPUT_KEY": DASHBOARD_KEY,
+        "DASHBOARD_CACHE_TTL": "0",
+        "HISTORY_WINDOW_SECONDS": str(10 * 365 * 24 * 3600),
+        "HISTORY_MAX_POINTS": str(args.history),
+    })
+    add_to_path(DASHBOARD_DIR, FUNCTION_DIR)
+    import types
+    import mymodule
+    from app import build_dashboard
+    quiet_logging()
+
+    # A history of runtime outputs, as the runtime would have stored them
+    redis_client = connect_redis(decode_responses=False)
+    redis_client.delete(DASHBOARD_KEY, f"{DASHBOARD_KEY}-history")
+    context = types.SimpleNamespace(env={})
+    pipeline = redis_client.pipeline(transaction=False)
+    for data in generate_snapshots(args.cores, args.history):
+        payload = json.dumps(mymodule.handler(data, context))
+        pipeline.xadd(f"{DASHBOARD_KEY}-history", {"data": payload})
+        pipeline.set(DASHBOARD_KEY, payload)
+    pipeline.execute()
+
+    latencies = []
+    cpu_started = time.process_time()
+    started = time.perf_counter()
+    for _ in range(args.renders):
+        render_started = time.perf_counter()
+        build_dashboard()
+        latencies.append((time.perf_counter() - render_started) * 1000)
+    wall_seconds = time.perf_counter() - started
+    cpu_seconds = time.process_time() - cpu_started
+    return summarize(latencies, wall_seconds, cpu_seconds, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+def run_scenario(name, args):
+    if name.startswith("handler:"):
+        return run_handler(name.split(":", 1)[1], args)
+    if name == "pipeline":
+        return run_pipeline(args)
+    if name == "dashboard":
+        return run_dashboard(args)
+    raise ValueError(f"Unknown scenario '{name}'")
+
+def get_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def spawn_scenario(name, argv):
+    # The runtime and the dashboard both have an app.py, and peak RSS is per process: one interpreter per scenario
+    command = [sys.executable, os.path.abspath(__file__), "--run-scenario", name, *argv]
+    completed = subprocess.run(command, capture_output=True, text=True)
+    if completed.returncode != 0:
+        print(f"{name} failed:\n{completed.stderr[-2000:]}", file=sys.stderr)
+        return None
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def print_report(report, baseline=None):
+    print(f"{'scenario':<30} {'inv/s':>10} {'p50 (ms)':>10} {'p99 (ms)':>10} {'CPU ms/inv':>11} {'RSS (MB)':>9}")
+    for name, result in report["scenarios"].items():
+        line = (f"{name:<30} {result['throughput_per_s']:>10.1f} {result['latency_ms']['p50']:>10.3f} "
+                f"{result['latency_ms']['p99']:>10.3f} {result['cpu_ms_per_invocation']:>11.3f} {result['peak_rss_mb']:>9.1f}")
+        previous = (baseline or {}).get("scenarios", {}).get(name)
+        if previous:
+            def change(new, old):
+                return f"{100.0 * (new - old) / old:+.1f}%" if old else "n/a"
+            line += (f"   vs {baseline['commit']}: p50 {change(result['latency_ms']['p50'], previous['latency_ms']['p50'])}, "
+                     f"CPU {change(result['cpu_ms_per_invocation'], previous['cpu_ms_per_invocation'])}, "
+                     f"RSS {change(result['peak_rss_mb'], previous['peak_rss_mb'])}")
+        print(line)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--cores", type=int, default=8)
+    parser.add_argument("--invocations", type=int, default=2000, help="handler scenarios")
+    parser.add_argument("--rate", type=float, default=20.0, help="pipeline: snapshots per second")
+    parser.add_argument("--duration", type=float, default=10.0, help="pipeline: seconds")
+    parser.add_argument("--history", type=int, default=720, help="dashboard: outputs in the history")
+    parser.add_argument("--renders", type=int, default=20, help="dashboard: view builds")
+    parser.add_argument("--output", help="report path, suite-<commit>.json by default")
+    parser.add_argument("--compare", help="previous report to compare with")
+    parser.add_argument("--run-scenario", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_scenario:
+        print(json.dumps(run_scenario(args.run_scenario, args)))
+        sys.exit(0)
+
+    argv = [f"--cores={args.cores}", f"--invocations={args.invocations}", f"--rate={args.rate}",
+            f"--duration={args.duration}", f"--history={args.history}", f"--renders={args.renders}"]
+    commit = get_commit()
+    report = {
+        "commit": commit,
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {name: getattr(args, name) for name in ("cores", "invocations", "rate", "duration", "history", "renders")},
+        "scenarios": {},
+    }
+    for name in filter(None, (name.strip() for name in args.scenarios.split(","))):
+        result = spawn_scenario(name, argv)
+        if result is not None:
+            report["scenarios"][name] = result
+
+    output = args.output or f"suite-{commit}.json"
+    with open(output, "w") as report_file:
+        json.dump(report, report_file, indent=2)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+    print_report(report, baseline)
+    print(f"\nReport written to {output}")
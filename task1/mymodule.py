@@ -1,5 +1,16 @@
+import collections
 import datetime
+import functools
+import itertools
 import logging
+import math
+import operator
+
+# NumPy is only needed by the columnar handler
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -51,39 +62,103 @@ def get_measurement_datetime(input: dict) ->  datetime.datetime:
     # TODO: validate if need to do any extra verification here
     return datetime.datetime.fromisoformat(timestamp_string)
 
-# Function to return the updated CPU history list
-def get_updated_history_list(context: object, key: str, cutoff_datetime: datetime) -> list:
+# Length of the time window used for the CPU moving average
+MOVING_AVERAGE_WINDOW = datetime.timedelta(seconds=60)
+
+# Class to keep the measurements of a time window together with running aggregates, so that
+# adding a measurement and evicting the expired ones costs amortized O(1) instead of rebuilding the list
+class SlidingWindow:
+    def __init__(self, window_length: datetime.timedelta):
+        self.window_length = window_length
+        self.samples = collections.deque()
+        self.sum = 0.0
+        # Monotonic deques of candidates, their first element is the current min/max of the window
+        self.min_candidates = collections.deque()
+        self.max_candidates = collections.deque()
+
+    def push(self, measurement_datetime: datetime.datetime, value: float):
+        sample = (measurement_datetime, value)
+        self.samples.append(sample)
+        self.sum += value
+
+        # A new value makes every older candidate that is worse than it useless
+        while self.min_candidates and self.min_candidates[-1][1] > value:
+            self.min_candidates.pop()
+        self.min_candidates.append(sample)
+        while self.max_candidates and self.max_candidates[-1][1] < value:
+            self.max_candidates.pop()
+        self.max_candidates.append(sample)
+
+        self.evict(measurement_datetime - self.window_length)
+
+    def evict(self, cutoff_datetime: datetime.datetime):
+        # Samples arrive in time order, so the expired ones are always at the head
+        while self.samples and self.samples[0][0] < cutoff_datetime:
+            sample = self.samples.popleft()
+            self.sum -= sample[1]
+            if self.min_candidates and self.min_candidates[0] is sample:
+                self.min_candidates.popleft()
+            if self.max_candidates and self.max_candidates[0] is sample:
+                self.max_candidates.popleft()
+
+        # Reset the running sum when the window empties so floating point errors don't accumulate
+        if not self.samples:
+            self.sum = 0.0
+
+    @property
+    def count(self) -> int:
+        return len(self.samples)
+
+    @property
+    def average(self) -> float:
+        if not self.samples:
+            return 0.0
+        return self.sum / len(self.samples)
+
+    @property
+    def min(self) -> float:
+        return self.min_candidates[0][1] if self.min_candidates else 0.0
+
+    @property
+    def max(self) -> float:
+        return self.max_candidates[0][1] if self.max_candidates else 0.0
+
+    def to_state(self) -> dict:
+        # Plain data for the runtime's context snapshots. The candidates are the sample tuples themselves
+        # (evict compares them by identity), so they're stored as indexes into the samples
+        indexes = {id(sample): index for index, sample in enumerate(self.samples)}
+        return {
+            'window_length': self.window_length // ONE_MICROSECOND,
+            'times': [(measurement_datetime - EPOCH) // ONE_MICROSECOND for measurement_datetime, _ in self.samples],
+            'values': [value for _, value in self.samples],
+            'sum': self.sum,
+            'min_candidates': [indexes[id(sample)] for sample in self.min_candidates],
+            'max_candidates': [indexes[id(sample)] for sample in self.max_candidates]
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> 'SlidingWindow':
+        window = cls(state['window_length'] * ONE_MICROSECOND)
+        samples = [(EPOCH + measurement_time * ONE_MICROSECOND, value) for measurement_time, value in zip(state['times'], state['values'])]
+        window.samples.extend(samples)
+        window.sum = state['sum']
+        window.min_candidates.extend(samples[index] for index in state['min_candidates'])
+        window.max_candidates.extend(samples[index] for index in state['max_candidates'])
+        return window
+
+# Function to return the sliding window of a key stored in context.env, creating it if needed
+def get_sliding_window(context: object, key: str, window_length: datetime.timedelta) -> SlidingWindow:
     # Make sure that there is something inside context.env
-    if "cpu_history" not in context.env:
-        context.env["cpu_history"] = {}
-    
-    # Get the CPU usage history list from env
-    cpu_history = context.env["cpu_history"]
-    
-    # If there is nothing in the env, we can just return an empty list
-    if (not cpu_history.get(key)):
-        return []
-    
-    # Instantiate an empty list
-    history_list = []
-    
-    # If there is something in the env, we need to keep only the updated values in the list
-    for (measurement_datetime, value) in cpu_history.get(key):
-        if (measurement_datetime >= cutoff_datetime):
-            history_list.append((measurement_datetime, value))
-    
-    return history_list
+    if "cpu_windows" not in context.env:
+        context.env["cpu_windows"] = {}
 
-# Function to calculate the CPU average usage value
-def get_average_usage(history_list) -> float:
-    if not history_list:
-        return 0.0
-    
-    sum_usage = 0.0
-    for (_, value) in history_list:
-        sum_usage += value
-    return sum_usage / len(history_list)
-    
+    # Get the window of this key, or create an empty one
+    cpu_windows = context.env["cpu_windows"]
+    window = cpu_windows.get(key)
+    if window is None:
+        window = SlidingWindow(window_length)
+        cpu_windows[key] = window
+    return window
 
 def get_moving_average(input: dict, context: object) -> dict[str, float]:
     # Create empty result dict to store the moving average for each CPU
@@ -92,35 +167,354 @@ def get_moving_average(input: dict, context: object) -> dict[str, float]:
     # Get the measurement datetime, will be the timestemp received as input converted to a datime or the current datetime
     measurement_datetime = get_measurement_datetime(input)
     
-    # Calculate the cutoff datetime, we  will use this above to keep only valid measurements in the context.env
-    cutoff_datetime = measurement_datetime - datetime.timedelta(seconds=60) 
-    
     # Iterate on keys that starts with 'cpu_percent-'
     for key in input.keys():
         if key.startswith('cpu_percent-'):
             # Get the CPU usage value received as input or fallback to 0
             cpu_usage = input.get(key, 0.0)
             
-            # Get the updated CPU usage history list (a list of CPU usages with measurements that happened at the last minute)
-            history_list = get_updated_history_list(context, key, cutoff_datetime)
+            # Add the current CPU usage to the window, this also evicts measurements older than the window length
+            window = get_sliding_window(context, key, MOVING_AVERAGE_WINDOW)
+            window.push(measurement_datetime, cpu_usage)
             
-            # Add the current CPU usage to the lsit
-            history_list.append((measurement_datetime, cpu_usage))
-            
-            # Calculate the moving average value itself
-            average_usage = get_average_usage(history_list)
-            
-            # Update the list in the env
-            context.env["cpu_history"][key] = history_list
+            # The moving average comes from the running sum of the window
+            average_usage = window.average
             
             # Update the list in the result dict
             _, cpu_number = key.split("-", 1)
-            metric_name = f'avg-util-cpu{cpu_number}-60sec'
+            metric_name = f'avg-util-cpu{cpu_number}-{int(MOVING_AVERAGE_WINDOW.total_seconds())}sec'
             result[metric_name] = average_usage
             logger.info(f"[INFO] Computed {metric_name}: {average_usage}")
 
     return result
             
+# Reference datetime used to store measurement datetimes as integer microseconds
+EPOCH = datetime.datetime(1970, 1, 1)
+ONE_MICROSECOND = datetime.timedelta(microseconds=1)
+
+# Class to keep the measurements of every CPU in a single time x core NumPy ring buffer, so that the
+# moving averages of all the cores are updated with a handful of vectorized operations per invocation.
+# While every snapshot carries every CPU the running sums are updated in the same order as SlidingWindow, so the
+# averages are exactly the same. Expired rows are evicted for all the CPUs at once (SlidingWindow evicts a key
+# only when it gets a new value), so when CPUs are missing from some snapshots they can differ by float rounding
+class ColumnarWindow:
+    def __init__(self, window_length: datetime.timedelta, capacity: int = 64):
+        self.window_length = window_length // ONE_MICROSECOND
+        self.times = np.zeros(capacity, dtype=np.int64)
+        self.values = np.zeros((capacity, 0))
+        self.present = np.zeros((capacity, 0), dtype=bool)
+        self.sums = np.zeros(0)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.start = 0
+        self.size = 0
+        # Cached key -> column index and column index -> output key
+        self.columns = {}
+        self.metric_names = []
+        # Cached layout of the last input, reused while the input keys don't change
+        self.input_layout = None
+        self.input_keys = ()
+        self.input_columns = np.zeros(0, dtype=np.intp)
+        self.input_metric_names = []
+        self.get_input_values = None
+
+    def add_column(self, key: str, metric_name: str) -> int:
+        self.columns[key] = len(self.metric_names)
+        self.metric_names.append(metric_name)
+        self.values = np.pad(self.values, ((0, 0), (0, 1)))
+        self.present = np.pad(self.present, ((0, 0), (0, 1)))
+        self.sums = np.pad(self.sums, (0, 1))
+        self.counts = np.pad(self.counts, (0, 1))
+        return self.columns[key]
+
+    def grow(self):
+        # Unwrap the ring into a buffer twice as large, the oldest measurement goes to row 0
+        order = (self.start + np.arange(self.size)) % len(self.times)
+        capacity = 2 * len(self.times)
+        self.times = np.concatenate([self.times[order], np.zeros(capacity - self.size, dtype=np.int64)])
+        self.values = np.concatenate([self.values[order], np.zeros((capacity - self.size, self.values.shape[1]))])
+        self.present = np.concatenate([self.present[order], np.zeros((capacity - self.size, self.present.shape[1]), dtype=bool)])
+        self.start = 0
+
+    def update_input_layout(self, input: dict):
+        # Scan the input keys only when the layout changed, then read the CPU values with a single itemgetter call
+        self.input_layout = tuple(input)
+        self.input_keys = tuple(key for key in input.keys() if key.startswith('cpu_percent-'))
+        for key in self.input_keys:
+            if key not in self.columns:
+                _, cpu_number = key.split("-", 1)
+                self.add_column(key, f'avg-util-cpu{cpu_number}-{int(MOVING_AVERAGE_WINDOW.total_seconds())}sec')
+        self.input_columns = np.array([self.columns[key] for key in self.input_keys], dtype=np.intp)
+        self.input_metric_names = [self.metric_names[column] for column in self.input_columns]
+        self.get_input_values = operator.itemgetter(*self.input_keys) if self.input_keys else None
+
+    def read_input_values(self, input: dict):
+        # Same keys in the same order as the last input (a cheap C-level comparison), or the layout is rebuilt
+        if tuple(input) != self.input_layout:
+            self.update_input_layout(input)
+        values = self.get_input_values(input) if self.get_input_values else ()
+        if len(self.input_keys) == 1:
+            values = (values,)
+        return np.array(values, dtype=np.float64)
+
+    def push(self, measurement_datetime: datetime.datetime, input: dict) -> dict[str, float]:
+        values = self.read_input_values(input)
+        columns = self.input_columns
+        measurement_time = (measurement_datetime - EPOCH) // ONE_MICROSECOND
+        if self.size == len(self.times):
+            self.grow()
+
+        # Write the new row, CPUs absent from this input are stored as 0.0 and not counted
+        row = (self.start + self.size) % len(self.times)
+        self.times[row] = measurement_time
+        self.values[row] = 0.0
+        self.values[row, columns] = values
+        self.present[row] = False
+        self.present[row, columns] = True
+        self.size += 1
+        self.sums[columns] += values
+        self.counts[columns] += 1
+
+        # Evict the expired rows from the head of the ring
+        cutoff_time = measurement_time - self.window_length
+        while self.size and self.times[self.start] < cutoff_time:
+            self.sums -= self.values[self.start]
+            self.counts -= self.present[self.start]
+            self.start = (self.start + 1) % len(self.times)
+            self.size -= 1
+        self.sums[self.counts == 0] = 0.0
+
+        # Window means of every CPU in the input with a single vectorized division
+        averages = self.sums[columns] / self.counts[columns]
+        return dict(zip(self.input_metric_names, averages.tolist()))
+
+    def to_state(self) -> dict:
+        # Plain data for the runtime's context snapshots, the input layout cache is rebuilt on the next push
+        return {
+            'window_length': self.window_length,
+            'times': self.times,
+            'values': self.values,
+            'present': self.present,
+            'sums': self.sums,
+            'counts': self.counts,
+            'start': self.start,
+            'size': self.size,
+            'columns': self.columns,
+            'metric_names': self.metric_names
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> 'ColumnarWindow':
+        window = cls(state['window_length'] * ONE_MICROSECOND)
+        for name, value in state.items():
+            setattr(window, name, value)
+        return window
+
+def get_columnar_moving_average(input: dict, context: object) -> dict[str, float]:
+    # Keep a single ColumnarWindow for all the CPUs inside context.env
+    if "cpu_columns" not in context.env:
+        context.env["cpu_columns"] = ColumnarWindow(MOVING_AVERAGE_WINDOW)
+
+    result = context.env["cpu_columns"].push(get_measurement_datetime(input), input)
+    logger.info(f"[INFO] Computed {len(result)} CPU moving averages")
+    return result
+
+# Windows of the multi-resolution CPU aggregates, each one is covered by ROLLUP_BUCKETS fixed-size buckets
+# (5 s, 25 s and 5 min buckets), every bucket length has to be a multiple of the previous one
+ROLLUP_WINDOWS = [datetime.timedelta(minutes=1), datetime.timedelta(minutes=5), datetime.timedelta(hours=1)]
+ROLLUP_BUCKETS = 12
+
+# Class to keep the buckets of one resolution, each bucket is [start, sum, count, min, max] with the start
+# in seconds since EPOCH. Running totals of the buckets in the window are kept like in SlidingWindow
+class RollupTier:
+    def __init__(self, bucket_length: int, bucket_count: int):
+        self.bucket_length = bucket_length
+        self.bucket_count = bucket_count
+        # The window starts this many seconds before the start of the current bucket
+        self.window_start = (bucket_count - 1) * bucket_length
+        self.buckets = collections.deque()
+        self.sum = 0.0
+        self.count = 0
+        # (min, max) of every bucket but the last one, which are the only ones that don't change in place.
+        # None when they have to be rescanned
+        self.closed_extremes = (math.inf, -math.inf)
+
+    def add(self, bucket: list):
+        # Merge a sample or a closed bucket of the finer tier, return our previous bucket if it just closed
+        start = bucket[0] - bucket[0] % self.bucket_length
+        self.sum += bucket[1]
+        self.count += bucket[2]
+        if self.buckets and self.buckets[-1][0] == start:
+            current = self.buckets[-1]
+            current[1] += bucket[1]
+            current[2] += bucket[2]
+            current[3] = min(current[3], bucket[3])
+            current[4] = max(current[4], bucket[4])
+            return None
+        closed = self.buckets[-1] if self.buckets else None
+        if closed is not None and self.closed_extremes is not None:
+            self.closed_extremes = (min(self.closed_extremes[0], closed[3]), max(self.closed_extremes[1], closed[4]))
+        self.buckets.append([start, bucket[1], bucket[2], bucket[3], bucket[4]])
+        return closed
+
+    def evict(self, seconds: float):
+        # Drop the buckets that left the window, return the last one if it's among them since it wasn't rolled up yet
+        cutoff = seconds - seconds % self.bucket_length - self.window_start
+        if not self.buckets or self.buckets[0][0] >= cutoff:
+            return None
+        expired = None
+        while self.buckets and self.buckets[0][0] < cutoff:
+            bucket = self.buckets.popleft()
+            self.sum -= bucket[1]
+            self.count -= bucket[2]
+            if not self.buckets:
+                expired = bucket
+            # The extremes only have to be rescanned when they may have left with this bucket
+            elif self.closed_extremes is not None and (bucket[3] <= self.closed_extremes[0] or bucket[4] >= self.closed_extremes[1]):
+                self.closed_extremes = None
+        if expired is not None:
+            self.closed_extremes = (math.inf, -math.inf)
+
+        # Reset the running sum when the window empties so floating point errors don't accumulate
+        if not self.buckets:
+            self.sum = 0.0
+        return expired
+
+    def extremes(self) -> tuple:
+        # (min, max) of the buckets in the window, (inf, -inf) when it's empty
+        if self.closed_extremes is None:
+            closed = list(itertools.islice(self.buckets, len(self.buckets) - 1)) if self.buckets else []
+            self.closed_extremes = (min([bucket[3] for bucket in closed], default=math.inf),
+                                    max([bucket[4] for bucket in closed], default=-math.inf))
+        if not self.buckets:
+            return self.closed_extremes
+        last = self.buckets[-1]
+        closed_min, closed_max = self.closed_extremes
+        return (last[3] if last[3] < closed_min else closed_min), (last[4] if last[4] > closed_max else closed_max)
+
+    def to_state(self) -> list:
+        return [self.bucket_length, self.bucket_count, list(self.buckets), self.sum, self.count]
+
+    @classmethod
+    def from_state(cls, state: list) -> 'RollupTier':
+        bucket_length, bucket_count, buckets, total, count = state
+        tier = cls(bucket_length, bucket_count)
+        tier.buckets.extend(buckets)
+        tier.sum = total
+        tier.count = count
+        tier.closed_extremes = None
+        return tier
+
+# Class to keep the average, min and max of one CPU over several windows with bounded memory: samples go into the
+# buckets of the finest tier, and every bucket that closes is rolled up into the next tier. The last bucket of a tier
+# hasn't been rolled up yet, so the coarser windows add it (and the last ones of the finer tiers) to their own totals
+class RollupWindow:
+    def __init__(self, windows: list = ROLLUP_WINDOWS, bucket_count: int = ROLLUP_BUCKETS):
+        self.tiers = []
+        for window in windows:
+            bucket_length = int(window.total_seconds()) // bucket_count
+            if bucket_length <= 0 or (self.tiers and bucket_length % self.tiers[-1].bucket_length):
+                raise ValueError(f"Invalid rollup window {window} for {bucket_count} buckets")
+            self.tiers.append(RollupTier(bucket_length, bucket_count))
+
+    def push(self, measurement_datetime: datetime.datetime, value: float):
+        seconds = (measurement_datetime - EPOCH).total_seconds()
+        # A sample is a bucket of one value
+        rolled = [[seconds, value, 1, value, value]]
+        for tier in self.tiers:
+            closed = []
+            for bucket in rolled:
+                previous = tier.add(bucket)
+                if previous is not None:
+                    closed.append(previous)
+            expired = tier.evict(seconds)
+            if expired is not None:
+                closed.append(expired)
+            rolled = closed
+
+    def to_state(self) -> list:
+        # Plain data for the runtime's context snapshots
+        return [tier.to_state() for tier in self.tiers]
+
+    @classmethod
+    def from_state(cls, state: list) -> 'RollupWindow':
+        window = cls.__new__(cls)
+        window.tiers = [RollupTier.from_state(tier) for tier in state]
+        return window
+
+    def aggregates(self) -> list:
+        # (average, min, max) of every window, in one pass from the finest to the coarsest tier
+        result = []
+        pending_sum = 0.0
+        pending_count = 0
+        pending_min = math.inf
+        pending_max = -math.inf
+        for tier in self.tiers:
+            count = tier.count + pending_count
+            if count:
+                tier_min, tier_max = tier.extremes()
+                result.append(((tier.sum + pending_sum) / count,
+                               tier_min if tier_min < pending_min else pending_min,
+                               tier_max if tier_max > pending_max else pending_max))
+            else:
+                result.append((0.0, 0.0, 0.0))
+            if tier.buckets:
+                last = tier.buckets[-1]
+                pending_sum += last[1]
+                pending_count += last[2]
+                if last[3] < pending_min:
+                    pending_min = last[3]
+                if last[4] > pending_max:
+                    pending_max = last[4]
+        return result
+
+@functools.lru_cache(maxsize=None)
+def get_rollup_metric_names(key: str) -> list:
+    # (tier index, average, min and max output keys) of the windows a CPU input key reports
+    _, cpu_number = key.split("-", 1)
+    names = []
+    for index, window in enumerate(ROLLUP_WINDOWS):
+        # The sliding window of handler covers this one exactly (see get_moving_extremes)
+        if window == MOVING_AVERAGE_WINDOW:
+            continue
+        window_name = f'{int(window.total_seconds())}sec'
+        names.append((index, f'avg-util-cpu{cpu_number}-{window_name}', f'min-util-cpu{cpu_number}-{window_name}',
+                      f'max-util-cpu{cpu_number}-{window_name}'))
+    return names
+
+def get_rollup_aggregates(input: dict, context: object) -> dict[str, float]:
+    # Keep one RollupWindow per CPU inside context.env
+    if "cpu_rollups" not in context.env:
+        context.env["cpu_rollups"] = {}
+    cpu_rollups = context.env["cpu_rollups"]
+
+    result = {}
+    measurement_datetime = get_measurement_datetime(input)
+    for key in input.keys():
+        if key.startswith('cpu_percent-'):
+            rollup = cpu_rollups.get(key)
+            if rollup is None:
+                rollup = cpu_rollups[key] = RollupWindow()
+            rollup.push(measurement_datetime, input.get(key, 0.0))
+
+            aggregates = rollup.aggregates()
+            for index, average_name, min_name, max_name in get_rollup_metric_names(key):
+                result[average_name], result[min_name], result[max_name] = aggregates[index]
+
+    logger.info(f"[INFO] Computed {len(result)} CPU rollup aggregates")
+    return result
+
+def get_moving_extremes(input: dict, context: object) -> dict[str, float]:
+    # Min and max of the sliding windows handler just pushed to, so the 60 s aggregates agree with its average
+    result = {}
+    window_name = f'{int(MOVING_AVERAGE_WINDOW.total_seconds())}sec'
+    for key in input.keys():
+        if key.startswith('cpu_percent-'):
+            window = get_sliding_window(context, key, MOVING_AVERAGE_WINDOW)
+            _, cpu_number = key.split("-", 1)
+            result[f'min-util-cpu{cpu_number}-{window_name}'] = window.min
+            result[f'max-util-cpu{cpu_number}-{window_name}'] = window.max
+    return result
+
 def handler(input: dict, context: object) -> dict[str, float]:
     logger.info(f"[INFO] Handler function called with the following input: {input}")
     result = {
@@ -129,4 +523,51 @@ def handler(input: dict, context: object) -> dict[str, float]:
         **get_moving_average(input, context)
     }
     logger.info(f"[INFO] Handler function result: {result}")
-    return result
\ No newline at end of file
+    return result
+
+# Same output as handler (up to float rounding when CPUs are missing from some snapshots), but computes the
+# CPU moving averages with the NumPy columnar window.
+# Select it with FUNCTION_HANDLER=columnar_handler
+def columnar_handler(input: dict, context: object) -> dict[str, float]:
+    if np is None:
+        logger.warning("[WARNING] NumPy is not installed, falling back to the default handler.")
+        return handler(input, context)
+
+    result = {
+        'percent-network-egress': get_percentage_of_outgoing_network_traffic(input),
+        'percent-memory-cache': get_percentage_of_memory_caching_content(input),
+        **get_columnar_moving_average(input, context)
+    }
+    logger.info(f"[INFO] Handler function result: {result}")
+    return result
+
+# Only the network and memory percentages, a pure function of five input fields.
+# Select it with FUNCTION_HANDLER=percentages_handler; the runtime memoizes it on those fields
+def percentages_handler(input: dict, context: object) -> dict[str, float]:
+    return {
+        'percent-network-egress': get_percentage_of_outgoing_network_traffic(input),
+        'percent-memory-cache': get_percentage_of_memory_caching_content(input)
+    }
+
+percentages_handler.__memoize__ = {
+    'fields': [
+        'net_io_counters_eth0-bytes_sent',
+        'net_io_counters_eth0-bytes_recv',
+        'virtual_memory-cached',
+        'virtual_memory-buffers',
+        'virtual_memory-total'
+    ]
+}
+
+# Same output as handler, plus the min and max of its 60 s windows (min-util-cpuN-60sec, max-util-cpuN-60sec) and
+# the average, min and max over the longer windows of ROLLUP_WINDOWS (avg-util-cpuN-300sec, max-util-cpuN-3600sec, ...).
+# Those come from time buckets, so a window covers between ROLLUP_BUCKETS - 1 and ROLLUP_BUCKETS bucket lengths;
+# the 60 s values all come from the exact sliding window instead, the 1 minute tier only feeds the coarser ones.
+# Select it with FUNCTION_HANDLER=rollup_handler
+def rollup_handler(input: dict, context: object) -> dict[str, float]:
+    result = {
+        **handler(input, context),
+        **get_moving_extremes(input, context),
+        **get_rollup_aggregates(input, context)
+    }
+    return result
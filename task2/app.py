@@ -1,19 +1,45 @@
 import os
 import json
+import queue
+import time
 import redis
 import dash
 import dash_bootstrap_components as dbc
 from dash import dcc, html
 from dash.dependencies import Input, Output
+from flask import Response, abort
 import plotly.graph_objs as go
+import numpy as np
 import datetime
 
+from redis_io import create_redis_client
+from serialization import decode_payload, DECODE_ERRORS
+from decimation import decimate
+from view_cache import ViewCache
+from push import UpdateBroadcaster
+
 REDIS_HOST = os.getenv("REDIS_HOST", "192.168.121.187")
 REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
 REDIS_OUTPUT_KEY = os.getenv("REDIS_OUTPUT_KEY", "jeanevangelista-proj3-output")
-INTERVAL_SECONDS = 1000 * 5
+# In push mode new points arrive over server-sent events (/updates), the interval only resyncs the whole page
+PUSH_MODE = os.getenv("PUSH_MODE", "0") == "1"
+PUSH_RESYNC_SECONDS = int(os.getenv("PUSH_RESYNC_SECONDS", "60"))
+PUSH_HEARTBEAT_SECONDS = int(os.getenv("PUSH_HEARTBEAT_SECONDS", "15"))
+INTERVAL_SECONDS = 1000 * (PUSH_RESYNC_SECONDS if PUSH_MODE else 5)
+# The runtime appends every output to a capped stream, the line chart only reads the last HISTORY_WINDOW_SECONDS of it
+HISTORY_KEY = os.getenv("HISTORY_KEY", f"{REDIS_OUTPUT_KEY}-history")
+HISTORY_WINDOW_SECONDS = int(os.getenv("HISTORY_WINDOW_SECONDS", "900"))
+HISTORY_MAX_POINTS = int(os.getenv("HISTORY_MAX_POINTS", "1000"))
+# Points sent to the browser per line (lttb, minmax or none), and the total above which lines are drawn with WebGL
+CHART_MAX_POINTS = int(os.getenv("CHART_MAX_POINTS", "300"))
+CHART_DECIMATION = os.getenv("CHART_DECIMATION", "minmax")
+WEBGL_THRESHOLD = int(os.getenv("WEBGL_THRESHOLD", "5000"))
+# Seconds a built view is shared between viewers and workers, 0 builds it on every callback
+DASHBOARD_CACHE_TTL = int(os.getenv("DASHBOARD_CACHE_TTL", "30"))
 
-r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+# Payloads are read as bytes, the runtime may write them as msgpack
+r = create_redis_client(REDIS_HOST, REDIS_PORT, decode_responses=False)
+view_cache = ViewCache(r, f"dashboard-cache:{REDIS_OUTPUT_KEY}", ttl=DASHBOARD_CACHE_TTL)
 
 app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
 app.title = "Project 3: Serverless Computing and Monitoring Dashboard"
@@ -23,7 +49,8 @@ app.layout = dbc.Container([
     html.Div([html.P(f"Reading data from Redis: {REDIS_HOST}:{REDIS_PORT}, key={REDIS_OUTPUT_KEY}", style={"fontStyle": "italic"})]),
     html.Div(id='status-msg', className="text-info mb-2"),
     dcc.Interval(id='interval-component', interval=INTERVAL_SECONDS, n_intervals=0),
-    dcc.Store(id='cpu-history-store', data={}),  # Store for CPU history
+    # Read by assets/push.js
+    html.Div(id='push-config', hidden=True, **{"data-url": "/updates", "data-max-points": str(CHART_MAX_POINTS)}) if PUSH_MODE else None,
     dbc.Row([
         dbc.Col([html.H4("Outgoing Traffic Bytes (%)"), html.Div(id='network-egress', className="display-4 text-primary")], width=3),
         dbc.Col([html.H4("Memory Caching Content (%)"), html.Div(id='memory-cache', className="display-4 text-success")], width=3),
@@ -39,10 +66,54 @@ app.layout = dbc.Container([
 ], fluid=True)
 
 def fetch_data_from_redis():
-    data_json = r.get(REDIS_OUTPUT_KEY)
+    try:
+        data_json = r.get(REDIS_OUTPUT_KEY)
+    except redis.RedisError:
+        # Retries are exhausted, show the "no data" state until Redis is back
+        return None
     if not data_json:
         return None
-    return json.loads(data_json)
+    try:
+        return decode_payload(data_json)
+    except DECODE_ERRORS:
+        return None
+
+def get_payload_version():
+    # The id of the last history entry changes with every output the runtime stores
+    try:
+        entries = r.xrevrange(HISTORY_KEY, count=1)
+    except redis.RedisError:
+        return None
+    return entries[0][0] if entries else None
+
+def fetch_cpu_history(data_dict):
+    # Most recent entries first, so HISTORY_MAX_POINTS keeps the newest ones
+    min_id = int((time.time() - HISTORY_WINDOW_SECONDS) * 1000)
+    try:
+        entries = r.xrevrange(HISTORY_KEY, max="+", min=min_id, count=HISTORY_MAX_POINTS)
+    except redis.RedisError:
+        entries = []
+    cpu_history = {}
+    if not entries:
+        # History disabled (OUTPUT_HISTORY_MAXLEN=0), or nothing stored in the window because the output didn't
+        # change: the current value is the only point
+        return update_cpu_history(cpu_history, get_cpu_data(data_dict), datetime.datetime.now())
+    for entry_id, fields in reversed(entries):
+        try:
+            data_dict = decode_payload(fields[b"data"])
+        except (KeyError, *DECODE_ERRORS):
+            continue
+        # Entry ids start with the time (ms) the runtime stored the output
+        timestamp = datetime.datetime.fromtimestamp(int(entry_id.split(b"-")[0]) / 1000)
+        update_cpu_history(cpu_history, get_cpu_data(data_dict), timestamp)
+    return cpu_history
+
+def get_cpu_data(data_dict):
+    # Only the 60s averages, rollup_handler also outputs longer windows (avg-util-cpuN-300sec, ...)
+    cpu_keys = [k for k in data_dict.keys() if k.startswith("avg-util-cpu") and k.endswith("-60sec")]
+    cpu_data = [(int(k.split('-')[2][3:]), data_dict[k]) for k in cpu_keys]
+    cpu_data.sort(key=lambda x: x[0])
+    return cpu_data
 
 def calculate_y_range(values, padding=5):
     if not values:
@@ -66,14 +137,27 @@ def build_bar_chart(cpu_data):
     )
     return fig
 
-def build_line_chart(cpu_history):
+def build_line_chart(cpu_history, max_points=CHART_MAX_POINTS, method=CHART_DECIMATION):
     all_values = []
-    fig = go.Figure()
+    lines = []
+    # Every line normally has the same timestamps, converting datetimes is the slowest part so it's done once
+    time_arrays = {}
     for label in sorted(cpu_history.keys()):
-        times = [pt[0] for pt in cpu_history[label]]
-        values = [pt[1] for pt in cpu_history[label]]
-        all_values.extend(values)
-        fig.add_trace(go.Scatter(x=times, y=values, mode='lines', name=label))
+        time_key = tuple(pt[0] for pt in cpu_history[label])
+        times = time_arrays.get(time_key)
+        if times is None:
+            times = time_arrays[time_key] = np.array(time_key, dtype="datetime64[ms]")
+        values = np.array([pt[1] for pt in cpu_history[label]], dtype=float)
+        # The range is computed on every point, decimation (LTTB) may drop the extremes
+        all_values.extend((values.min(), values.max()))
+        keep = decimate(times.astype(np.int64), values, max_points, method)
+        lines.append((label, times[keep], values[keep]))
+
+    # SVG lines get slow with many points, WebGL doesn't
+    scatter = go.Scattergl if sum(len(values) for _, _, values in lines) > WEBGL_THRESHOLD else go.Scatter
+    fig = go.Figure()
+    for label, times, values in lines:
+        fig.add_trace(scatter(x=times, y=values, mode='lines', name=label))
     y_range = calculate_y_range(all_values)
     fig.update_layout(
         title="CPU Usage Over Time",
@@ -99,17 +183,15 @@ def update_cpu_history(cpu_history, cpu_data, timestamp):
         Output('cpu-line-chart', 'figure'),
         Output('raw-data', 'children'),
         Output('status-msg', 'children'),
-        Output('cpu-history-store', 'data'),
     ],
     [
         Input('interval-component', 'n_intervals'),
-        Input('cpu-history-store', 'data'),
     ]
 )
-def update_dashboard(n, cpu_history):
-    if n == 0:
-        cpu_history = {}
+def update_dashboard(n):
+    return view_cache.get_or_build(get_payload_version(), build_dashboard)
 
+def build_dashboard():
     data_dict = fetch_data_from_redis()
     if not data_dict:
         return (
@@ -118,8 +200,7 @@ def update_dashboard(n, cpu_history):
             go.Figure(),
             go.Figure(),
             "No data found in Redis.",
-            "Waiting for serverless function output...",
-            cpu_history
+            "Waiting for serverless function output..."
         )
 
     network_egress = data_dict.get("percent-network-egress", 0.0)
@@ -127,12 +208,8 @@ def update_dashboard(n, cpu_history):
     net_egress_str = f"{network_egress:.2f}"
     mem_cache_str = f"{memory_cache:.2f}"
 
-    cpu_keys = [k for k in data_dict.keys() if k.startswith("avg-util-cpu")]
-    cpu_data = [(int(k.split('-')[2][3:]), data_dict[k]) for k in cpu_keys]
-    cpu_data.sort(key=lambda x: x[0])
-
-    timestamp = datetime.datetime.fromisoformat(data_dict.get("timestamp", datetime.datetime.now().isoformat()).replace("Z", ""))
-    cpu_history = update_cpu_history(cpu_history, cpu_data, timestamp)
+    cpu_data = get_cpu_data(data_dict)
+    cpu_history = fetch_cpu_history(data_dict)
 
     cpu_bar_chart = build_bar_chart(cpu_data)
     cpu_line_chart = build_line_chart(cpu_history)
@@ -146,10 +223,48 @@ def update_dashboard(n, cpu_history):
         cpu_bar_chart,
         cpu_line_chart,
         raw_text,
-        status_message,
-        cpu_history
+        status_message
     )
 
+def format_push_update(entry_id, fields):
+    # Only the new point of every line, the client appends it with Plotly.extendTraces
+    try:
+        data_dict = decode_payload(fields[b"data"])
+    except (KeyError, *DECODE_ERRORS):
+        return None
+    timestamp = datetime.datetime.fromtimestamp(int(entry_id.split(b"-")[0]) / 1000)
+    return {
+        "time": timestamp.isoformat(timespec="milliseconds"),
+        "cpu": {f"cpu{cpu_num}": value for cpu_num, value in get_cpu_data(data_dict)},
+        "egress": data_dict.get("percent-network-egress"),
+        "cache": data_dict.get("percent-memory-cache"),
+    }
+
+broadcaster = UpdateBroadcaster(r, HISTORY_KEY, format_push_update)
+
 server = app.server
+
+@server.route("/updates")
+def stream_updates():
+    if not PUSH_MODE:
+        abort(404)
+    broadcaster.start()
+    updates = broadcaster.subscribe()
+
+    def events():
+        try:
+            while True:
+                try:
+                    message = updates.get(timeout=PUSH_HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    # Keeps proxies from closing an idle stream, and finds out when the client is gone
+                    yield ": heartbeat\n\n"
+                    continue
+                yield f"data: {message}\n\n"
+        finally:
+            broadcaster.unsubscribe(updates)
+
+    return Response(events(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 if __name__ == "__main__":
     app.run_server(debug=True, host="0.0.0.0", port=8501)
@@ -0,0 +1,68 @@
+// Push mode (PUSH_MODE=1): the points sent by /updates are appended to the line chart with Plotly.extendTraces
+// and the bar chart is restyled in place. Full figures only come from the interval callback, which then just
+// resynchronizes the page every PUSH_RESYNC_SECONDS.
+(function () {
+    function getGraph(id) {
+        var container = document.getElementById(id);
+        var graph = container && container.querySelector('.js-plotly-plot');
+        return graph && graph.data ? graph : null;
+    }
+
+    function setText(id, value) {
+        var element = document.getElementById(id);
+        if (element && typeof value === 'number') {
+            element.textContent = value.toFixed(2);
+        }
+    }
+
+    function applyUpdate(update, maxPoints) {
+        if (!window.Plotly) {
+            return;
+        }
+        var line = getGraph('cpu-line-chart');
+        if (line) {
+            var indices = [], xs = [], ys = [];
+            line.data.forEach(function (trace, index) {
+                if (trace.name in update.cpu) {
+                    indices.push(index);
+                    xs.push([update.time]);
+                    ys.push([update.cpu[trace.name]]);
+                }
+            });
+            if (indices.length) {
+                Plotly.extendTraces(line, {x: xs, y: ys}, indices, maxPoints);
+            }
+        }
+        var bar = getGraph('cpu-chart');
+        if (bar && bar.data.length) {
+            Plotly.restyle(bar, {x: [Object.keys(update.cpu)], y: [Object.values(update.cpu)]}, [0]);
+        }
+        setText('network-egress', update.egress);
+        setText('memory-cache', update.cache);
+    }
+
+    function connect() {
+        var config = document.getElementById('push-config');
+        if (!config) {
+            return false;
+        }
+        var maxPoints = parseInt(config.dataset.maxPoints, 10);
+        // EventSource reconnects on its own when the connection drops
+        var source = new EventSource(config.dataset.url);
+        source.onmessage = function (event) {
+            applyUpdate(JSON.parse(event.data), maxPoints);
+        };
+        return true;
+    }
+
+    // The layout is rendered by Dash after this script runs. Dash serves every asset, so with PUSH_MODE=0 there
+    // is no #push-config and the polling stops after MAX_TRIES
+    var MAX_TRIES = 40;
+    var tries = 0;
+    var timer = setInterval(function () {
+        tries += 1;
+        if (connect() || tries >= MAX_TRIES) {
+            clearInterval(timer);
+        }
+    }, 500);
+})();
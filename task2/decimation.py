@@ -0,0 +1,48 @@
+import numpy as np
+
+def minmax_indices(x, y, threshold):
+    # Keeps the lowest and highest point of every bucket, so spikes always survive
+    n = len(y)
+    # Two points per bucket plus the first and last point
+    size = -(-n // ((threshold - 2) // 2))
+    buckets = -(-n // size)
+    padded = np.full(buckets * size, np.nan)
+    padded[:n] = y
+    rows = padded.reshape(buckets, size)
+    offsets = np.arange(buckets) * size
+    indices = np.concatenate([offsets + np.nanargmin(rows, axis=1), offsets + np.nanargmax(rows, axis=1), [0, n - 1]])
+    return np.unique(indices)
+
+def lttb_indices(x, y, threshold):
+    # Largest-Triangle-Three-Buckets: keeps the first and last point, and from every bucket in between the point
+    # forming the largest triangle with the point kept in the previous bucket and the average of the next one
+    n = len(y)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.intp)
+    counts = np.diff(edges)
+    average_x = np.add.reduceat(x[:-1], edges[:-1]) / counts
+    average_y = np.add.reduceat(y[:-1], edges[:-1]) / counts
+    average_x = np.append(average_x[1:], x[-1])
+    average_y = np.append(average_y[1:], y[-1])
+
+    selected = np.empty(threshold, dtype=np.intp)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        area = np.abs(
+            (x[a] - average_x[bucket]) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (average_y[bucket] - y[a])
+        )
+        a = start + int(np.argmax(area))
+        selected[bucket + 1] = a
+    return selected
+
+DECIMATION_METHODS = {"lttb": lttb_indices, "minmax": minmax_indices}
+
+def decimate(x, y, threshold, method="lttb"):
+    # Indices of at most `threshold` points of the series (x must be increasing, e.g. epoch milliseconds)
+    n = len(y)
+    if method not in DECIMATION_METHODS or threshold < 4 or n <= threshold:
+        return np.arange(n)
+    return DECIMATION_METHODS[method](np.asarray(x, dtype=float), np.asarray(y, dtype=float), threshold)
@@ -0,0 +1,6 @@
+import os
+
+bind = "0.0.0.0:8501"
+# Workers come from WEB_CONCURRENCY. In push mode every open tab holds a thread (its SSE stream) for as long as it's open
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "64" if os.getenv("PUSH_MODE", "0") == "1" else "4"))
@@ -0,0 +1,60 @@
+import json
+import queue
+import threading
+import redis
+
+class UpdateBroadcaster:
+    # One XREAD loop per (gunicorn worker) process on the output history stream, fanned out to the queue of
+    # every SSE client connected to that process
+    def __init__(self, redis_client, stream_key, format_entry, block_ms=2000, queue_size=100):
+        self.redis_client = redis_client
+        self.stream_key = stream_key
+        self.format_entry = format_entry
+        self.block_ms = block_ms
+        self.queue_size = queue_size
+        self.subscribers = set()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def start(self):
+        # Started on the first client, after gunicorn forked the worker (threads don't survive a fork)
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+
+    def subscribe(self):
+        updates = queue.Queue(maxsize=self.queue_size)
+        with self.lock:
+            self.subscribers.add(updates)
+        return updates
+
+    def unsubscribe(self, updates):
+        with self.lock:
+            self.subscribers.discard(updates)
+
+    def publish(self, message):
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for updates in subscribers:
+            try:
+                updates.put_nowait(message)
+            except queue.Full:
+                # A stalled client misses points until its next full refresh, it doesn't hold the others back
+                pass
+
+    def run(self):
+        last_id = "$"
+        while True:
+            try:
+                # Shorter than the socket timeout of the client
+                entries = self.redis_client.xread({self.stream_key: last_id}, block=self.block_ms)
+            except redis.RedisError:
+                threading.Event().wait(1)
+                continue
+            for _, messages in entries or []:
+                for entry_id, fields in messages:
+                    last_id = entry_id
+                    update = self.format_entry(entry_id, fields)
+                    if update is not None:
+                        self.publish(json.dumps(update))
@@ -0,0 +1,32 @@
+import os
+import redis
+
+from redis.backoff import DecorrelatedJitterBackoff
+from redis.retry import Retry
+
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "16"))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "5"))
+REDIS_CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", "5"))
+REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", "30"))
+REDIS_RETRIES = int(os.getenv("REDIS_RETRIES", "3"))
+REDIS_BACKOFF_BASE = float(os.getenv("REDIS_BACKOFF_BASE", "0.05"))
+REDIS_BACKOFF_CAP = float(os.getenv("REDIS_BACKOFF_CAP", "1"))
+
+# A bounded pool shared by every callback thread, keepalive, timeouts and jittered exponential backoff on
+# connection/timeout errors. Same REDIS_* variables as the serverless runtime, but shorter defaults: 3 retries
+# with a 0.05-1 s backoff and a 5 s socket timeout (the runtime uses 5 retries, 0.1-10 s and 10 s). A callback
+# waiting on Redis holds a page render, better to show the "no data" state and try again on the next interval
+def create_redis_client(host, port, decode_responses=True):
+    pool = redis.ConnectionPool(
+        host=host,
+        port=port,
+        decode_responses=decode_responses,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        socket_timeout=REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+        socket_keepalive=True,
+        health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
+        retry=Retry(DecorrelatedJitterBackoff(cap=REDIS_BACKOFF_CAP, base=REDIS_BACKOFF_BASE), REDIS_RETRIES),
+        retry_on_error=[redis.ConnectionError, redis.TimeoutError]
+    )
+    return redis.Redis(connection_pool=pool)
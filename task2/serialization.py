@@ -0,0 +1,28 @@
+import os
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Same setting as the serverless runtime, JSON is only read with orjson when PAYLOAD_CODEC=orjson (it rejects
+# NaN/Infinity and integers wider than 64 bits, which json accepts)
+PAYLOAD_CODEC = os.getenv("PAYLOAD_CODEC", "json")
+JSON_LOADS = orjson.loads if PAYLOAD_CODEC == "orjson" and orjson is not None else json.loads
+
+# Same detection as the serverless runtime (task3/app/serialization.py): JSON documents start with '{' or '[',
+# anything else was written with PAYLOAD_CODEC=msgpack
+DECODE_ERRORS = (ValueError, TypeError)
+
+def decode_payload(raw):
+    if isinstance(raw, str) or raw.lstrip()[:1] in (b"{", b"["):
+        return JSON_LOADS(raw)
+    if msgpack is None:
+        raise ValueError("payload isn't JSON and msgpack is not installed")
+    return msgpack.unpackb(raw, raw=False)
@@ -0,0 +1,78 @@
+import json
+import threading
+import time
+import uuid
+import redis
+import plotly.io
+
+# Deletes the build lock only if it's still ours (it may have expired and been taken by another worker)
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+class ViewCache:
+    # Callback results shared by every viewer and every gunicorn worker, keyed by the version of the data they
+    # were built from. One worker builds a version (the others wait on a SET NX lock), the result is kept in
+    # Redis for `ttl` seconds and the last version is also kept in process for as long, so N viewers cost one
+    # build per tick. Without a version (e.g. the output key is missing) nothing is cached
+    def __init__(self, redis_client, namespace, ttl=30, lock_timeout=10, wait_interval=0.05):
+        self.redis_client = redis_client
+        self.namespace = namespace
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+        self.wait_interval = wait_interval
+        self.release_lock = redis_client.register_script(RELEASE_LOCK_SCRIPT)
+        self.local_version = None
+        self.local_value = None
+        self.local_time = 0.0
+        self.local_lock = threading.Lock()
+
+    def get_or_build(self, version, build):
+        if version is None or not self.ttl:
+            return build()
+        with self.local_lock:
+            if self.local_version == version and time.monotonic() - self.local_time < self.ttl:
+                return self.local_value
+
+        key = f"{self.namespace}:{version.decode() if isinstance(version, bytes) else version}"
+        try:
+            value = self.load(key)
+            if value is None:
+                value = self.build_once(key, build)
+        except redis.RedisError:
+            # Without Redis every worker builds its own views
+            value = build()
+
+        with self.local_lock:
+            self.local_version = version
+            self.local_value = value
+            self.local_time = time.monotonic()
+        return value
+
+    def build_once(self, key, build):
+        lock_key = f"{key}:lock"
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.lock_timeout
+        while not self.redis_client.set(lock_key, token, nx=True, ex=self.lock_timeout):
+            # Another worker is building this version, wait for its result rather than building it too
+            time.sleep(self.wait_interval)
+            value = self.load(key)
+            if value is not None:
+                return value
+            if time.monotonic() >= deadline:
+                return build()
+        try:
+            value = build()
+            payload = plotly.io.json.to_json_plotly(value)
+            self.redis_client.set(key, payload, ex=self.ttl)
+            # Viewers get the same (plain JSON) value whether it was built here or loaded
+            return json.loads(payload)
+        finally:
+            self.release_lock(keys=[lock_key], args=[token])
+
+    def load(self, key):
+        payload = self.redis_client.get(key)
+        return json.loads(payload) if payload is not None else None
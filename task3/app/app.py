@@ -1,33 +1,71 @@
-import time
+import signal
 
 from redis_utils import *
-from handler import get_handler, execute_handler
+from handler import load_handler, execute_handler
 from local_env import *
 from context import Context
+from triggers import get_inputs
+from state import create_state_backend
+from sharding import is_sharded, serve_sharded
+from metrics import start_metrics_server
+from reloader import HandlerReloader
+from change_detection import ChangeDetector
+from chaining import get_outputs
+
+def serve(redis_client, reloader, context):
+    # The handler only fires when the trigger yields a new input (a poll cycle, a keyspace event or a stream entry)
+    changes = ChangeDetector()
+    changes.restore_input(context.input_key, context.input_fingerprint)
+    for data in get_inputs(redis_client, context.input_key, changes=changes):
+        handler = reloader.get_handler()
+        reloader.migrate(context)
+        output = execute_handler(handler, data, context)
+        context.input_fingerprint = changes.last_input(context.input_key)
+        if output and context.output_key:
+            # One round trip for the output and the tapped outputs of a chain
+            store_many_in_redis(redis_client, get_outputs(context, output), changes)
+        context.save_state()
 
 if __name__ == "__main__":
     redis_client = initialize_redis_client()
     if not redis_client:
         exit(1)
 
-    handler = get_handler()
+    handler, source = load_handler()
 
     if not handler:
         logger.error("[ERROR] No valid serverless function entrypoint found. Exiting.")
         exit(1)
 
     logger.info("[INFO] Starting serverless function execution...")
+    reloader = HandlerReloader(handler, source)
+
+    # Kubernetes sends SIGTERM before killing the pod, take a last snapshot of the context(s)
+    signal.signal(signal.SIGTERM, lambda signum, frame: exit(0))
+
+    # With several sharded workers every worker process serves its own metrics
+    if not (is_sharded() and RUNTIME_WORKERS > 1 and RUNTIME_MODE != "async"):
+        start_metrics_server()
+
+    if RUNTIME_MODE == "async":
+        from async_app import serve_async
+        serve_async(reloader)
+        exit(0)
+
+    if is_sharded():
+        serve_sharded(reloader)
+        exit(0)
+
     context = Context(
         host=REDIS_HOST,
         port=REDIS_PORT,
         input_key=REDIS_INPUT_KEY,
-        output_key=REDIS_OUTPUT_KEY
+        output_key=REDIS_OUTPUT_KEY,
+        state_backend=create_state_backend(REDIS_HOST, REDIS_PORT, REDIS_INPUT_KEY, REDIS_OUTPUT_KEY)
     )
 
-    while True:
-        data = fetch_data_from_redis(redis_client, REDIS_INPUT_KEY)
-        if data:
-            output = execute_handler(handler, data, context)
-            if output and REDIS_OUTPUT_KEY:
-                store_data_in_redis(redis_client, REDIS_OUTPUT_KEY, output)
-        time.sleep(REDIS_MONITORING_PERIOD)
+    logger.info(f"[INFO] Trigger mode: {REDIS_TRIGGER_MODE}")
+    try:
+        serve(redis_client, reloader, context)
+    finally:
+        context.save_state(force=True)
@@ -0,0 +1,150 @@
+import asyncio
+import concurrent.futures
+import time
+import redis
+
+from logs import logger
+from metrics import STAGE_SECONDS, REDIS_ERRORS
+from local_env import *
+from redis_utils import create_async_connection_pool, decode_data, encode_data, mget_raw, queue_output_writes
+from handler import execute_handler_async
+from sharding import discover_keys, owns_key, create_context, get_replica_index
+from change_detection import ChangeDetector
+from chaining import get_outputs
+
+class AsyncRuntime:
+    # Every input key gets a bounded queue drained by a single consumer task, so invocations of the same key
+    # never overlap and keep their order, while different keys (and I/O-bound handlers) run concurrently
+    def __init__(self, reloader, redis_client, replica_index=0, period=REDIS_MONITORING_PERIOD):
+        self.reloader = reloader
+        self.handler = reloader.handler
+        self.redis_client = redis_client
+        self.replica_index = replica_index
+        self.period = period
+        self.semaphore = asyncio.Semaphore(ASYNC_MAX_CONCURRENCY)
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=ASYNC_MAX_CONCURRENCY)
+        self.changes = ChangeDetector()
+        self.contexts = {}
+        self.queues = {}
+        self.consumers = {}
+
+    async def discover_keys(self):
+        if not REDIS_INPUT_PATTERN:
+            return discover_keys(None)
+        try:
+            keys = set()
+            async for key in self.redis_client.scan_iter(match=REDIS_INPUT_PATTERN, count=1000, _type="STRING"):
+                keys.add(key)
+            return sorted(keys)
+        except redis.RedisError as e:
+            REDIS_ERRORS.inc()
+            logger.error(f"[ERROR] Redis error while scanning keys matching '{REDIS_INPUT_PATTERN}': {e}")
+            return None
+
+    async def update_keys(self):
+        keys = await self.discover_keys()
+        if keys is None:
+            return
+        owned_keys = {key for key in keys if owns_key(key, self.replica_index, REPLICA_COUNT, 0, 1)}
+        for key in set(self.contexts) - owned_keys:
+            self.consumers.pop(key).cancel()
+            self.queues.pop(key)
+            context = self.contexts.pop(key)
+            context.save_state(force=True)
+            self.changes.forget(key)
+            self.changes.forget(context.output_key)
+        for key in owned_keys - set(self.contexts):
+            self.contexts[key] = create_context(key)
+            self.changes.restore_input(key, self.contexts[key].input_fingerprint)
+            self.queues[key] = asyncio.Queue(maxsize=ASYNC_QUEUE_SIZE)
+            self.consumers[key] = asyncio.create_task(self.consume(key))
+        logger.info(f"[INFO] Async runtime owns {len(self.contexts)} of {len(keys)} input keys")
+
+    def enqueue(self, key, data, fingerprint=None):
+        queue = self.queues.get(key)
+        if queue is None:
+            return
+        if queue.full():
+            # The handler of this key is falling behind, keep the most recent inputs
+            queue.get_nowait()
+            logger.warning(f"[WARNING] Input queue of '{key}' is full, dropping its oldest input")
+        queue.put_nowait((data, fingerprint))
+
+    async def poll(self):
+        keys = list(self.queues)
+        if not keys:
+            return
+        try:
+            with STAGE_SECONDS.time("fetch"):
+                values = await mget_raw(self.redis_client, keys)
+        except redis.RedisError as e:
+            REDIS_ERRORS.inc()
+            logger.error(f"[ERROR] Redis error while fetching data for {len(keys)} keys: {e}")
+            return
+        for key, value in zip(keys, values):
+            if not value or not self.changes.input_changed(key, value):
+                continue
+            data = decode_data(key, value)
+            if data:
+                # The consumer snapshots the fingerprint with the invocation, the poll loop may already be ahead
+                self.enqueue(key, data, self.changes.last_input(key))
+
+    async def store(self, outputs):
+        # The output and the tapped outputs of a chain, in one round trip
+        encoded = {}
+        for key, output in outputs.items():
+            value = encode_data(key, output)
+            if value is not None and self.changes.output_changed(key, value):
+                encoded[key] = value
+        if not encoded:
+            return
+        try:
+            with STAGE_SECONDS.time("store"):
+                await queue_output_writes(self.redis_client.pipeline(transaction=False), encoded).execute()
+            logger.info(f"[INFO] Data stored in Redis under key(s): {', '.join(encoded)}")
+        except redis.RedisError as e:
+            for key in encoded:
+                self.changes.discard_output(key)
+            REDIS_ERRORS.inc()
+            logger.error(f"[ERROR] Redis error while storing data for key(s) {', '.join(encoded)}: {e}")
+
+    async def consume(self, key):
+        context = self.contexts[key]
+        queue = self.queues[key]
+        loop = asyncio.get_running_loop()
+        while True:
+            data, fingerprint = await queue.get()
+            # Each consumer migrates its own context, so no invocation sees it half migrated
+            self.reloader.migrate(context)
+            # Returns only once no thread runs the handler on this context anymore, timed out or not
+            async with self.semaphore:
+                output = await execute_handler_async(self.handler, data, context, self.executor, HANDLER_TIMEOUT)
+            context.input_fingerprint = fingerprint
+            if output and context.output_key:
+                await self.store(get_outputs(context, output))
+            # Snapshots (when due) do blocking Redis I/O, keep them off the event loop
+            await loop.run_in_executor(self.executor, context.save_state)
+
+    async def run(self):
+        next_discovery = 0
+        try:
+            while True:
+                if time.monotonic() >= next_discovery:
+                    await self.update_keys()
+                    next_discovery = time.monotonic() + KEY_DISCOVERY_PERIOD
+                # The check may download the archive, keep it off the event loop
+                self.handler = await asyncio.get_running_loop().run_in_executor(self.executor, self.reloader.get_handler)
+                await self.poll()
+                await asyncio.sleep(self.period)
+        finally:
+            for consumer in self.consumers.values():
+                consumer.cancel()
+            for context in self.contexts.values():
+                context.save_state(force=True)
+            self.executor.shutdown(wait=False)
+            await self.redis_client.aclose()
+
+def serve_async(reloader):
+    redis_client = redis.asyncio.Redis(connection_pool=create_async_connection_pool())
+    logger.info(f"[INFO] Starting asyncio runtime (max concurrency {ASYNC_MAX_CONCURRENCY}, handler timeout {HANDLER_TIMEOUT}s)")
+    asyncio.run(AsyncRuntime(reloader, redis_client, get_replica_index()).run())
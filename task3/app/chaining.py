@@ -0,0 +1,99 @@
+import inspect
+
+from collections.abc import MutableMapping
+from logs import logger
+from metrics import STAGE_SECONDS
+from local_env import FUNCTION_TAPS
+from memoization import memoize_handler
+
+# Each stage keeps its state under context.env["stage:<name>"], so it's snapshotted and migrated with the rest
+STAGE_ENV_PREFIX = "stage:"
+
+class StageEnv(MutableMapping):
+    # A stage's share of context.env, only looked up when the stage uses it (pure stages leave context.env alone)
+    def __init__(self, context, key):
+        self.context = context
+        self.key = key
+
+    def load(self):
+        env = self.context.env
+        if self.key not in env:
+            env[self.key] = {}
+        return env[self.key]
+
+    def __getitem__(self, key):
+        return self.load()[key]
+
+    def __setitem__(self, key, value):
+        self.load()[key] = value
+
+    def __delitem__(self, key):
+        del self.load()[key]
+
+    def __contains__(self, key):
+        return key in self.load()
+
+    def __iter__(self):
+        return iter(self.load())
+
+    def __len__(self):
+        return len(self.load())
+
+class StageContext:
+    # What a stage gets as its context: the runtime's context (keys, host, ...) with an env of its own
+    def __init__(self, context, stage):
+        self.context = context
+        self.stage = stage
+        self.env = StageEnv(context, f"{STAGE_ENV_PREFIX}{stage}")
+
+    def __getattr__(self, name):
+        return getattr(self.context, name)
+
+class HandlerChain:
+    # Runs the stages in order in the same process, each one gets the output of the previous one as its input.
+    # A stage returning None ends the chain (nothing is stored). The outputs of the tapped stages are left on
+    # context.taps for the runtime to store next to the final one
+    def __init__(self, stages, taps=()):
+        self.stages = stages
+        self.taps = set(taps)
+
+    def __call__(self, data, context):
+        taps = {}
+        for name, handler in self.stages:
+            try:
+                with STAGE_SECONDS.time(f"handler:{name}"):
+                    data = handler(data, StageContext(context, name))
+            except Exception as e:
+                raise RuntimeError(f"stage '{name}' failed: {e}") from e
+            if data is None:
+                break
+            if name in self.taps:
+                taps[name] = data
+        if self.taps:
+            context.taps = taps
+        return data
+
+def build_chain(stages, taps=FUNCTION_TAPS):
+    # stages is a list of (name, handler), a single one is returned as is
+    if len(stages) == 1:
+        return stages[0][1]
+    for name, handler in stages:
+        if inspect.iscoroutinefunction(handler):
+            logger.error(f"[ERROR] Stage '{name}' is a coroutine, async handlers can't be chained")
+            return None
+    names = [name for name, _ in stages]
+    taps = [name.strip() for name in taps.split(",") if name.strip()]
+    for name in taps:
+        if name not in names:
+            logger.warning(f"[WARNING] FUNCTION_TAPS names '{name}', which isn't a stage of the chain")
+    logger.info(f"[INFO] Chaining {len(stages)} handlers: {' -> '.join(names)}")
+    # Stages that opted in (__memoize__) are memoized on their own input
+    stages = [(name, memoize_handler(handler) if hasattr(handler, "__memoize__") else handler) for name, handler in stages]
+    return HandlerChain(stages, taps)
+
+def get_outputs(context, output):
+    # The final output under the output key, and each tapped stage's output under <output key>:<stage>
+    outputs = {context.output_key: output}
+    for stage, tapped in vars(context).pop("taps", {}).items():
+        outputs[f"{context.output_key}:{stage}"] = tapped
+    return outputs
@@ -0,0 +1,54 @@
+import hashlib
+
+from metrics import SKIPPED_INPUTS, PROCESSED_INPUTS, SKIPPED_WRITES
+from local_env import SKIP_UNCHANGED_INPUT
+
+def fingerprint(raw):
+    if isinstance(raw, str):
+        raw = raw.encode()
+    return hashlib.blake2b(raw, digest_size=16).digest()
+
+class ChangeDetector:
+    # Remembers a hash of the last raw input and encoded output of every key. An input identical to the previous
+    # one is dropped before it is decoded (so the handler doesn't add the same sample to its window twice), and
+    # an output identical to the one already stored isn't written again
+    def __init__(self, enabled=SKIP_UNCHANGED_INPUT):
+        self.enabled = enabled
+        self.inputs = {}
+        self.outputs = {}
+
+    def input_changed(self, key, raw):
+        if self.enabled:
+            digest = fingerprint(raw)
+            if self.inputs.get(key) == digest:
+                SKIPPED_INPUTS.inc()
+                return False
+            self.inputs[key] = digest
+        PROCESSED_INPUTS.inc()
+        return True
+
+    def output_changed(self, key, encoded):
+        if not self.enabled:
+            return True
+        digest = fingerprint(encoded)
+        if self.outputs.get(key) == digest:
+            SKIPPED_WRITES.inc()
+            return False
+        self.outputs[key] = digest
+        return True
+
+    def last_input(self, key):
+        return self.inputs.get(key)
+
+    def restore_input(self, key, digest):
+        # The last input a restored context had processed, the same value still in Redis is skipped after a restart
+        if digest is not None:
+            self.inputs.setdefault(key, digest)
+
+    def discard_output(self, key):
+        # The write failed, the next output has to be written even if it's the same
+        self.outputs.pop(key, None)
+
+    def forget(self, key):
+        self.inputs.pop(key, None)
+        self.outputs.pop(key, None)
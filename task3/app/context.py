@@ -2,18 +2,32 @@ import os
 
 from datetime import datetime
 from logs import logger
+from local_env import USERMODULE_PATH
+from state import MemoryStateBackend
 
 class Context:
-    def __init__(self, host, port, input_key, output_key):
+    def __init__(self, host, port, input_key, output_key, state_backend=None):
         self.host = host
         self.port = port
         self.input_key = input_key
         self.output_key = output_key
+        self.update_function_getmtime()
+        self.last_execution = None
+        # Version of the handler the objects in env were created with, see HandlerReloader.migrate
+        self.handler_generation = 0
+        self.state_backend = state_backend or MemoryStateBackend()
+        self.env = self.state_backend.restore()
+        # Fingerprint of the last input the handler processed (see ChangeDetector), snapshotted with env
+        self.input_fingerprint = self.state_backend.input_fingerprint
+
+    def update_function_getmtime(self):
         try:
-            tmp = os.path.getmtime("/opt/usermodule.py")
+            tmp = os.path.getmtime(USERMODULE_PATH)
             self.function_getmtime = datetime.fromtimestamp(tmp).strftime('%Y-%m-%d %H:%M:%S')
         except FileNotFoundError:
-            logger.warning("[INFO] usermodule.py not found; function_getmtime set to 'Unknown'.")
+            logger.warning(f"[INFO] {USERMODULE_PATH} not found; function_getmtime set to 'Unknown'.")
             self.function_getmtime = "Unknown"
-        self.last_execution = None
-        self.env = {}
+
+    def save_state(self, force=False):
+        self.state_backend.save(self.env, force, self.input_fingerprint)
+
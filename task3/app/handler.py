@@ -1,40 +1,167 @@
+import asyncio
+import compileall
+import hashlib
 import importlib
+import importlib.util
+import inspect
+import json
 import os
+import shutil
 import tempfile
 import zipfile
 import requests
 import sys
+import time
 
 from logs import logger
-from local_env import ZIPFILE_URL, FUNCTION_HANDLER
+from metrics import STAGE_SECONDS, INVOCATIONS, HANDLER_ERRORS, PROFILER
+from local_env import *
+from memoization import memoize_handler
+from isolation import isolate_handler
+from chaining import build_chain
 
-def download_and_extract_zip(zip_url):
+def load_cache_index(cache_dir):
     try:
-        response = requests.get(zip_url, stream=True)
-        response.raise_for_status()
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".zip") as temp_zip:
-            temp_zip.write(response.content)
-            temp_zip_path = temp_zip.name
-        extracted_dir = tempfile.mkdtemp()
-        with zipfile.ZipFile(temp_zip_path, 'r') as zip_ref:
-            zip_ref.extractall(extracted_dir)
-        os.unlink(temp_zip_path)
-        logger.error(f"[ERROR] Extracted dir found: {extracted_dir}")
+        with open(os.path.join(cache_dir, "index.json")) as index_file:
+            return json.load(index_file)
+    except (OSError, ValueError):
+        return {}
+
+def save_cache_index(cache_dir, index):
+    # Write and rename, so a crash never leaves a truncated index behind
+    temp_path = os.path.join(cache_dir, f"index.json.{os.getpid()}")
+    with open(temp_path, "w") as index_file:
+        json.dump(index, index_file)
+    os.replace(temp_path, os.path.join(cache_dir, "index.json"))
+
+def extract_into_cache(zip_path, extracted_dir):
+    # Extract next to the final directory and rename it, so a half-extracted tree is never used
+    staging_dir = tempfile.mkdtemp(dir=os.path.dirname(extracted_dir))
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        zip_ref.extractall(staging_dir)
+    if ZIPFILE_PRECOMPILE:
+        # ddir keeps the final path in tracebacks
+        compileall.compile_dir(staging_dir, ddir=extracted_dir, quiet=1)
+    try:
+        os.rename(staging_dir, extracted_dir)
+    except OSError:
+        # Another process extracted the same archive first
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+def download_and_extract_zip(zip_url, cache_dir=ZIPFILE_CACHE_DIR):
+    # Archives are cached by content hash; the URL's ETag/Last-Modified allow a conditional GET on the next start
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+    except OSError as e:
+        logger.error(f"[ERROR] Failed to create the ZIP cache dir '{cache_dir}': {e}")
+        return None
+    index = load_cache_index(cache_dir)
+    entry = index.get(zip_url, {})
+    cached_dir = os.path.join(cache_dir, entry["sha256"]) if entry.get("sha256") else None
+    if cached_dir and not os.path.isdir(cached_dir):
+        cached_dir = None
+
+    headers = {}
+    if cached_dir and entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if cached_dir and entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+
+    temp_zip_path = None
+    try:
+        with requests.get(zip_url, stream=True, headers=headers, timeout=ZIPFILE_TIMEOUT) as response:
+            if response.status_code == 304:
+                logger.info(f"[INFO] ZIP file not modified, using cached dir: {cached_dir}")
+                return cached_dir
+            response.raise_for_status()
+
+            # Stream the archive to disk in chunks, hashing it on the way
+            digest = hashlib.sha256()
+            with tempfile.NamedTemporaryFile(dir=cache_dir, suffix=".zip", delete=False) as temp_zip:
+                temp_zip_path = temp_zip.name
+                for chunk in response.iter_content(chunk_size=ZIPFILE_CHUNK_SIZE):
+                    temp_zip.write(chunk)
+                    digest.update(chunk)
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+
+        sha256 = digest.hexdigest()
+        extracted_dir = os.path.join(cache_dir, sha256)
+        if os.path.isdir(extracted_dir):
+            logger.info(f"[INFO] ZIP file content already cached: {extracted_dir}")
+        else:
+            extract_into_cache(temp_zip_path, extracted_dir)
+            logger.info(f"[INFO] ZIP file extracted into: {extracted_dir}")
+
+        index[zip_url] = {"sha256": sha256, "etag": etag, "last_modified": last_modified}
+        save_cache_index(cache_dir, index)
         return extracted_dir
     except Exception as e:
         logger.error(f"[ERROR] Failed to download or extract ZIP file: {e}")
+        if cached_dir:
+            logger.warning(f"[WARNING] Using the previously cached ZIP file: {cached_dir}")
+        return cached_dir
+    finally:
+        if temp_zip_path and os.path.exists(temp_zip_path):
+            os.unlink(temp_zip_path)
+
+def load_manifest(directory):
+    try:
+        with open(os.path.join(directory, ZIPFILE_MANIFEST)) as manifest_file:
+            return json.load(manifest_file)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.error(f"[ERROR] Invalid {ZIPFILE_MANIFEST}, ignoring it: {e}")
         return None
 
+def get_handler_names(handler_name):
+    # "handler", "parse,aggregate" or ["parse", "aggregate"] (manifest), several names make a chain
+    names = handler_name if isinstance(handler_name, list) else str(handler_name).split(",")
+    return [name.strip() for name in names if name.strip()]
+
+def resolve_handler(handler_name, lookup):
+    stages = []
+    for name in get_handler_names(handler_name):
+        handler = lookup(name)
+        if handler is None:
+            logger.error(f"[ERROR] Handler '{name}' not found")
+            return None
+        # The same function twice in a chain still gets two stages (and two envs)
+        stage = name if name not in dict(stages) else f"{name}#{len(stages)}"
+        stages.append((stage, handler))
+    return build_chain(stages) if stages else None
+
+def iter_modules(directory):
+    for root, _, files in os.walk(directory):
+        for file in files:
+            if file.endswith(".py") and not file.startswith("__init__"):
+                yield importlib.import_module(file[:-3])
+
+def find_in_modules(directory, name):
+    for module in iter_modules(directory):
+        if hasattr(module, name):
+            return getattr(module, name)
+    return None
+
 def dynamic_import_from_dir(directory, handler_name):
     try:
         sys.path.insert(0, directory)
-        for root, _, files in os.walk(directory):
-            for file in files:
-                if file.endswith(".py") and not file.startswith("__init__"):
-                    module_name = file[:-3]
-                    module = importlib.import_module(module_name)
-                    if hasattr(module, handler_name):
-                        return getattr(module, handler_name)
+
+        # The manifest names the handler module (and optionally the handler), so nothing else gets imported.
+        # "handler" may also be a list of stages, "module:function" takes one from another module
+        manifest = load_manifest(directory)
+        if manifest and manifest.get("module"):
+            def lookup(name):
+                module_name, _, function_name = name.rpartition(":")
+                return getattr(importlib.import_module(module_name or manifest["module"]), function_name, None)
+            handler = resolve_handler(manifest.get("handler", handler_name), lookup)
+            # "memoize": true (or {"fields": [...]} / {"exclude": [...]}) opts a pure handler into memoization
+            if handler is not None and manifest.get("memoize") and not hasattr(handler, "__memoize__"):
+                handler.__memoize__ = manifest["memoize"]
+            return handler
+
+        return resolve_handler(handler_name, lambda name: find_in_modules(directory, name))
     except Exception as e:
         logger.error(f"[ERROR] Failed to dynamically import handler: {e}")
     finally:
@@ -42,30 +169,72 @@ def dynamic_import_from_dir(directory, handler_name):
             sys.path.remove(directory)
     return None
 
-def get_handler():
-    handler = None
+def import_handler_from_file(path, handler_name, module_name='usermodule'):
+    try:
+        spec = importlib.util.spec_from_file_location(module_name, path)
+        module = importlib.util.module_from_spec(spec)
+        # Registered so the state backend can find the classes of the objects the handler keeps in context.env
+        sys.modules[module_name] = module
+        spec.loader.exec_module(module)
+        return resolve_handler(handler_name, lambda name: getattr(module, name, None))
+    except Exception as e:
+        logger.error(f"[ERROR] Failed to import handler from '{path}': {e}")
+    return None
+
+def wrap_handler(handler):
+    # Memoization stays in the runtime process, so cache hits don't cross to a worker
+    return memoize_handler(isolate_handler(handler))
 
+def load_handler():
+    # Returns the handler and where it came from, so the reloader knows what to watch
     if ZIPFILE_URL:
         logger.warning("[INFO] Trying to get the handler from the .zip file")
         extracted_dir = download_and_extract_zip(ZIPFILE_URL)
         if extracted_dir:
-            handler = dynamic_import_from_dir(extracted_dir, FUNCTION_HANDLER)
-            return handler
-                
-    if not handler:
-        logger.warning("[INFO] Falling back to usermodule.py")
-        usermodule_spec = importlib.util.find_spec('usermodule')
-        if usermodule_spec:
-            usermodule = importlib.util.module_from_spec(usermodule_spec)
-            usermodule_spec.loader.exec_module(usermodule)
-            handler = getattr(usermodule, FUNCTION_HANDLER, None)
-            return handler
-    
-    return None
+            return wrap_handler(dynamic_import_from_dir(extracted_dir, FUNCTION_HANDLER)), ("zip", extracted_dir)
+
+    logger.warning(f"[INFO] Falling back to {USERMODULE_PATH}")
+    if os.path.exists(USERMODULE_PATH):
+        return wrap_handler(import_handler_from_file(USERMODULE_PATH, FUNCTION_HANDLER)), ("file", USERMODULE_PATH)
+
+    return None, (None, None)
+
+def get_handler():
+    return load_handler()[0]
 
 def execute_handler(handler, data, context):
+    INVOCATIONS.inc()
     try:
-        return handler(data, context)
+        with STAGE_SECONDS.time("handler"), PROFILER.profiling():
+            return handler(data, context)
     except Exception as e:
+        HANDLER_ERRORS.inc()
         logger.error(f"[ERROR] Error in user-defined handler: {e}")
         return None
+
+async def execute_handler_async(handler, data, context, executor=None, timeout=None):
+    # The cProfile hook only covers the sync runtime, handlers here run across threads and await points
+    INVOCATIONS.inc()
+    started = time.perf_counter()
+    thread = None
+    try:
+        if inspect.iscoroutinefunction(handler):
+            return await asyncio.wait_for(handler(data, context), timeout)
+        # Sync handlers run in a thread that can't be interrupted, the shield keeps it awaitable after a timeout
+        thread = asyncio.get_running_loop().run_in_executor(executor, handler, data, context)
+        return await asyncio.wait_for(asyncio.shield(thread), timeout)
+    except asyncio.TimeoutError:
+        HANDLER_ERRORS.inc()
+        logger.error(f"[ERROR] User-defined handler timed out after {timeout}s")
+        if thread is not None:
+            # The thread still holds the context: the key's next input must not run on it until the thread is done
+            await asyncio.wait([thread])
+            if not thread.cancelled() and thread.exception() is not None:
+                logger.error(f"[ERROR] Timed out user-defined handler failed: {thread.exception()}")
+            logger.warning(f"[WARNING] Timed out user-defined handler finished after {time.perf_counter() - started:.1f}s")
+    except Exception as e:
+        HANDLER_ERRORS.inc()
+        logger.error(f"[ERROR] Error in user-defined handler: {e}")
+    finally:
+        STAGE_SECONDS.observe("handler", time.perf_counter() - started)
+    return None
@@ -0,0 +1,253 @@
+import hashlib
+import inspect
+import multiprocessing
+import os
+import resource
+import signal
+import threading
+import weakref
+
+from collections.abc import MutableMapping
+from logs import logger
+from metrics import WORKER_KILLS, WORKER_RECYCLES, merge_metrics, take_metrics
+from local_env import *
+
+class WorkerEnv(MutableMapping):
+    # context.env inside a pool worker. It's only fetched from the runtime the first time the handler uses it
+    # (pure handlers never pay for it, and memoization can still tell them apart), then the worker keeps it
+    # between invocations and only sends it back when the runtime asks for it
+    def __init__(self, conn, key):
+        self.conn = conn
+        self.key = key
+        self.data = None
+        self.dirty = False
+
+    def load(self):
+        self.dirty = True
+        if self.data is None:
+            self.conn.send(("env", self.key))
+            self.data = self.conn.recv()
+        return self.data
+
+    def take(self):
+        # The env if it was used since it was last sent back, None otherwise
+        if not self.dirty:
+            return None
+        self.dirty = False
+        return self.data
+
+    def __getitem__(self, key):
+        return self.load()[key]
+
+    def __setitem__(self, key, value):
+        self.load()[key] = value
+
+    def __delitem__(self, key):
+        del self.load()[key]
+
+    def __contains__(self, key):
+        return key in self.load()
+
+    def __iter__(self):
+        return iter(self.load())
+
+    def __len__(self):
+        return len(self.load())
+
+class WorkerContext:
+    def __init__(self, attributes, env):
+        self.__dict__.update(attributes)
+        self.env = env
+
+def get_context_attributes(context):
+    return {
+        name: value for name, value in vars(context).items()
+        if name not in ("env", "state_backend") and isinstance(value, (str, int, float, type(None)))
+    }
+
+def worker_main(conn, parent_conn, handler, memory_limit_mb):
+    # Forked with the runtime's end of the pipe open, which would keep the pipe from ever reporting EOF here
+    parent_conn.close()
+    # The parent's SIGTERM handler would run the runtime's shutdown code here
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    if memory_limit_mb:
+        # Address space rather than RSS, Linux doesn't enforce RLIMIT_RSS. A handler going over it gets a MemoryError
+        limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    # Drop the metrics recorded by the runtime before the fork, the worker only sends back its own
+    take_metrics()
+
+    contexts = {}
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            return
+        if message[0] == "stop":
+            return
+        if message[0] == "sync":
+            envs = {key: context.env.take() for key, context in contexts.items()}
+            conn.send({key: env for key, env in envs.items() if env is not None})
+            continue
+
+        _, key, attributes, data, sync = message
+        context = contexts.get(key)
+        if context is None:
+            context = contexts[key] = WorkerContext(attributes, WorkerEnv(conn, key))
+        else:
+            context.__dict__.update(attributes)
+        try:
+            reply = ("ok", handler(data, context))
+        except MemoryError:
+            # The heap may be in any state, don't keep this worker (the env changes since the last sync are lost)
+            conn.send(("error", "MemoryError: the handler went over the memory limit", None, None, take_metrics()))
+            os._exit(1)
+        except Exception as e:
+            reply = ("error", f"{type(e).__name__}: {e}")
+        # Outputs of the tapped stages of a chain, see chaining.HandlerChain
+        taps = vars(context).pop("taps", None)
+        # Chain stage timings and memoization counters are recorded here, the runtime adds them to its own
+        conn.send(reply + (context.env.take() if sync else None, taps, take_metrics()))
+
+class PoolWorker:
+    def __init__(self, handler, memory_limit_mb):
+        parent_conn, child_conn = multiprocessing.Pipe()
+        # Forked from the runtime, so the handler and its imports are already loaded (warm)
+        self.process = multiprocessing.get_context("fork").Process(target=worker_main, args=(child_conn, parent_conn, handler, memory_limit_mb), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+        self.invocations = 0
+
+    def stop(self, kill=False):
+        if kill:
+            self.process.kill()
+        else:
+            # Explicit, closing the pipe isn't enough: workers forked later hold a copy of this end too
+            try:
+                self.conn.send(("stop",))
+            except OSError:
+                pass
+        self.conn.close()
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+
+def apply_env(context, env):
+    for name in [name for name in context.env if name not in env]:
+        del context.env[name]
+    context.env.update(env)
+
+class IsolatedHandler:
+    # Runs the handler in a pool of pre-forked worker processes, so a hung or leaking handler can be killed
+    # without taking the runtime down. Each context always goes to the same worker, which keeps its env and
+    # sends it back every `env_sync` invocations (for the state snapshots, and for the next worker if this one
+    # is killed) and before being recycled
+    def __init__(self, handler, pool_size=ISOLATION_WORKERS, timeout=HANDLER_TIMEOUT, memory_limit_mb=ISOLATION_MEMORY_LIMIT_MB,
+                 max_invocations=ISOLATION_MAX_INVOCATIONS, env_sync=ISOLATION_ENV_SYNC):
+        self.handler = handler
+        self.pool_size = max(pool_size, 1)
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.max_invocations = max_invocations
+        self.env_sync = max(env_sync, 1)
+        self.workers = [None] * self.pool_size
+        self.locks = [threading.Lock() for _ in range(self.pool_size)]
+        self.contexts = weakref.WeakValueDictionary()
+        self.unsynced = {}
+        self.pid = os.getpid()
+        # Memoization options are read from the handler by the wrapper around this one
+        if hasattr(handler, "__memoize__"):
+            self.__memoize__ = handler.__memoize__
+
+    def get_worker(self, index):
+        if self.pid != os.getpid():
+            # Forked along with a sharded runtime worker, the pool belongs to the parent
+            self.workers = [None] * self.pool_size
+            self.pid = os.getpid()
+        worker = self.workers[index]
+        if worker is None or not worker.process.is_alive():
+            worker = self.workers[index] = PoolWorker(self.handler, self.memory_limit_mb)
+        return worker
+
+    def kill_worker(self, index):
+        WORKER_KILLS.inc()
+        self.workers[index].stop(kill=True)
+        self.workers[index] = None
+
+    def stop_worker(self, index):
+        # Takes back the env of every context the worker holds before letting it go
+        worker = self.workers[index]
+        try:
+            worker.conn.send(("sync",))
+            if worker.conn.poll(self.timeout):
+                for key, env in worker.conn.recv().items():
+                    self.unsynced.pop(key, None)
+                    context = self.contexts.get(key)
+                    if context is not None:
+                        apply_env(context, env)
+        except (EOFError, OSError):
+            pass
+        worker.stop()
+        self.workers[index] = None
+
+    def __call__(self, data, context):
+        key = context.input_key
+        index = int.from_bytes(hashlib.blake2b(str(key).encode(), digest_size=8).digest(), "big") % self.pool_size
+        self.contexts[key] = context
+        unsynced = self.unsynced.get(key, 0) + 1
+        sync = unsynced >= self.env_sync
+        with self.locks[index]:
+            worker = self.get_worker(index)
+            message = None
+            try:
+                worker.conn.send(("invoke", key, get_context_attributes(context), data, sync))
+                while worker.conn.poll(self.timeout):
+                    message = worker.conn.recv()
+                    if message[0] != "env":
+                        break
+                    # The worker doesn't have this context's env yet (first call, or a new worker)
+                    worker.conn.send(dict(context.env))
+                    message = None
+            except (EOFError, OSError):
+                self.kill_worker(index)
+                raise RuntimeError("handler worker died (killed, or over the memory limit)")
+            if message is None:
+                self.kill_worker(index)
+                raise TimeoutError(f"handler timed out after {self.timeout}s, its worker was killed")
+
+            status, result, env, taps, metrics = message
+            merge_metrics(metrics)
+            if taps is not None:
+                context.taps = taps
+            self.unsynced[key] = 0 if sync else unsynced
+            if env is not None:
+                apply_env(context, env)
+            worker.invocations += 1
+            if status == "error" and result.startswith("MemoryError"):
+                self.kill_worker(index)
+            elif self.max_invocations and worker.invocations >= self.max_invocations:
+                # Recycled, whatever the handler leaked goes away with the process
+                WORKER_RECYCLES.inc()
+                self.stop_worker(index)
+        if status == "error":
+            raise RuntimeError(result)
+        return result
+
+    def close(self):
+        # Called when the reloader swaps the handler (the workers still run the old code)
+        if self.pid != os.getpid():
+            return
+        for index, lock in enumerate(self.locks):
+            with lock:
+                if self.workers[index] is not None:
+                    self.stop_worker(index)
+
+def isolate_handler(handler):
+    # Coroutines can't be sent to another process, async handlers keep running on the event loop
+    if handler is None or not RUNTIME_ISOLATION or inspect.iscoroutinefunction(handler):
+        return handler
+    logger.info(f"[INFO] Running the handler in {ISOLATION_WORKERS} worker process(es) (timeout {HANDLER_TIMEOUT}s, "
+                f"memory limit {ISOLATION_MEMORY_LIMIT_MB or 'none'} MB, recycled every {ISOLATION_MAX_INVOCATIONS} invocations)")
+    return IsolatedHandler(handler)
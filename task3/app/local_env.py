@@ -7,3 +7,49 @@ REDIS_OUTPUT_KEY = os.getenv('REDIS_OUTPUT_KEY')
 REDIS_MONITORING_PERIOD = int(os.getenv('REDIS_MONITORING_PERIOD', 5))
 FUNCTION_HANDLER = os.getenv('FUNCTION_HANDLER', 'handler')
 ZIPFILE_URL = os.getenv('ZIPFILE_URL')
+REDIS_TRIGGER_MODE = os.getenv('REDIS_TRIGGER_MODE', 'poll')
+REDIS_STREAM_FIELD = os.getenv('REDIS_STREAM_FIELD', 'data')
+CONTEXT_STATE_BACKEND = os.getenv('CONTEXT_STATE_BACKEND', 'memory')
+CONTEXT_STATE_KEY = os.getenv('CONTEXT_STATE_KEY')
+CONTEXT_SNAPSHOT_PERIOD = int(os.getenv('CONTEXT_SNAPSHOT_PERIOD', 30))
+REDIS_INPUT_KEYS = os.getenv('REDIS_INPUT_KEYS')
+REDIS_INPUT_PATTERN = os.getenv('REDIS_INPUT_PATTERN')
+KEY_DISCOVERY_PERIOD = int(os.getenv('KEY_DISCOVERY_PERIOD', 30))
+REPLICA_COUNT = int(os.getenv('REPLICA_COUNT', 1))
+REPLICA_INDEX = os.getenv('REPLICA_INDEX')
+RUNTIME_WORKERS = int(os.getenv('RUNTIME_WORKERS', 1))
+REDIS_MAX_CONNECTIONS = int(os.getenv('REDIS_MAX_CONNECTIONS', 16))
+REDIS_SOCKET_TIMEOUT = float(os.getenv('REDIS_SOCKET_TIMEOUT', REDIS_MONITORING_PERIOD + 5))
+REDIS_CONNECT_TIMEOUT = float(os.getenv('REDIS_CONNECT_TIMEOUT', 5))
+REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv('REDIS_HEALTH_CHECK_INTERVAL', 30))
+REDIS_RETRIES = int(os.getenv('REDIS_RETRIES', 5))
+REDIS_BACKOFF_BASE = float(os.getenv('REDIS_BACKOFF_BASE', 0.1))
+REDIS_BACKOFF_CAP = float(os.getenv('REDIS_BACKOFF_CAP', 10))
+RUNTIME_MODE = os.getenv('RUNTIME_MODE', 'sync')
+HANDLER_TIMEOUT = float(os.getenv('HANDLER_TIMEOUT', 0)) or None
+ASYNC_MAX_CONCURRENCY = int(os.getenv('ASYNC_MAX_CONCURRENCY', 32))
+ASYNC_QUEUE_SIZE = int(os.getenv('ASYNC_QUEUE_SIZE', 8))
+METRICS_PORT = int(os.getenv('METRICS_PORT', 9102))
+RUNTIME_PROFILER = os.getenv('RUNTIME_PROFILER', '')
+ZIPFILE_CACHE_DIR = os.getenv('ZIPFILE_CACHE_DIR', '/tmp/function-cache')
+ZIPFILE_MANIFEST = os.getenv('ZIPFILE_MANIFEST', 'manifest.json')
+ZIPFILE_PRECOMPILE = os.getenv('ZIPFILE_PRECOMPILE', '1') == '1'
+ZIPFILE_TIMEOUT = float(os.getenv('ZIPFILE_TIMEOUT', 30))
+ZIPFILE_CHUNK_SIZE = int(os.getenv('ZIPFILE_CHUNK_SIZE', 64 * 1024))
+USERMODULE_PATH = os.getenv('USERMODULE_PATH', '/opt/usermodule.py')
+FUNCTION_RELOAD_CYCLES = int(os.getenv('FUNCTION_RELOAD_CYCLES', 10))
+ZIPFILE_RELOAD_PERIOD = float(os.getenv('ZIPFILE_RELOAD_PERIOD', 60))
+SKIP_UNCHANGED_INPUT = os.getenv('SKIP_UNCHANGED_INPUT', '1') == '1'
+PAYLOAD_CODEC = os.getenv('PAYLOAD_CODEC', 'json')
+OUTPUT_HISTORY_MAXLEN = int(os.getenv('OUTPUT_HISTORY_MAXLEN', 17280))
+OUTPUT_HISTORY_SUFFIX = os.getenv('OUTPUT_HISTORY_SUFFIX', '-history')
+FUNCTION_MEMOIZE = os.getenv('FUNCTION_MEMOIZE', '0') == '1'
+FUNCTION_MEMOIZE_EXCLUDE = os.getenv('FUNCTION_MEMOIZE_EXCLUDE', '')
+MEMO_MAX_ENTRIES = int(os.getenv('MEMO_MAX_ENTRIES', 1024))
+MEMO_TTL = float(os.getenv('MEMO_TTL', 300))
+RUNTIME_ISOLATION = os.getenv('RUNTIME_ISOLATION', '0') == '1'
+ISOLATION_WORKERS = int(os.getenv('ISOLATION_WORKERS', 2))
+ISOLATION_MEMORY_LIMIT_MB = int(os.getenv('ISOLATION_MEMORY_LIMIT_MB', 0))
+ISOLATION_MAX_INVOCATIONS = int(os.getenv('ISOLATION_MAX_INVOCATIONS', 1000))
+ISOLATION_ENV_SYNC = int(os.getenv('ISOLATION_ENV_SYNC', 1))
+FUNCTION_TAPS = os.getenv('FUNCTION_TAPS', '')
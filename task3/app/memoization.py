@@ -0,0 +1,148 @@
+import collections
+import hashlib
+import inspect
+import json
+import threading
+import time
+
+from collections.abc import MutableMapping
+from logs import logger
+from metrics import MEMO_HITS, MEMO_MISSES, MEMO_EVICTIONS
+from local_env import *
+
+def memoize(fields=None, exclude=None):
+    # Marks a pure handler (its output only depends on its input) as memoizable. `fields` restricts the cache key
+    # to these input fields, `exclude` leaves fields out of it (e.g. a timestamp the handler doesn't read).
+    # Handlers that don't want to import the runtime can set `handler.__memoize__ = True` (or the dict) themselves
+    def decorate(handler):
+        handler.__memoize__ = {"fields": fields, "exclude": exclude}
+        return handler
+    return decorate
+
+def get_memoize_options(handler):
+    options = getattr(handler, "__memoize__", None)
+    if options is None and FUNCTION_MEMOIZE:
+        options = {"exclude": [field.strip() for field in FUNCTION_MEMOIZE_EXCLUDE.split(",") if field.strip()]}
+    if not options:
+        return None
+    return options if isinstance(options, dict) else {}
+
+def make_key(data, fields=None, exclude=None):
+    # Canonical JSON (sorted keys, no whitespace), so equal inputs hash the same whatever their key order
+    if isinstance(data, dict):
+        if fields:
+            data = {field: data.get(field) for field in fields}
+        elif exclude:
+            data = {field: value for field, value in data.items() if field not in exclude}
+    try:
+        canonical = json.dumps(data, sort_keys=True, separators=(",", ":"))
+    except (TypeError, ValueError):
+        return None
+    return hashlib.blake2b(canonical.encode(), digest_size=16).digest()
+
+class EnvAccessTracker(MutableMapping):
+    # Stands in for context.env while a memoized handler runs, any use of it means the handler is stateful
+    def __init__(self, env):
+        self.env = env
+        self.touched = False
+
+    def __getitem__(self, key):
+        self.touched = True
+        return self.env[key]
+
+    def __setitem__(self, key, value):
+        self.touched = True
+        self.env[key] = value
+
+    def __delitem__(self, key):
+        self.touched = True
+        del self.env[key]
+
+    def __contains__(self, key):
+        self.touched = True
+        return key in self.env
+
+    def __iter__(self):
+        self.touched = True
+        return iter(self.env)
+
+    def __len__(self):
+        self.touched = True
+        return len(self.env)
+
+class MemoCache:
+    # LRU bounded by entry count, entries also expire `ttl` seconds after they were stored (0 keeps them)
+    def __init__(self, max_entries=MEMO_MAX_ENTRIES, ttl=MEMO_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires and time.monotonic() >= expires:
+                del self.entries[key]
+                MEMO_EVICTIONS.inc()
+                return None
+            self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl if self.ttl else 0, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                MEMO_EVICTIONS.inc()
+
+class MemoizedHandler:
+    # Wraps an opted-in handler. Cached outputs are shared between invocations, they must not be mutated
+    def __init__(self, handler, fields=None, exclude=None, cache=None):
+        self.handler = handler
+        self.fields = fields
+        self.exclude = set(exclude or ())
+        self.cache = cache or MemoCache()
+        self.stateful = False
+
+    def __call__(self, data, context):
+        key = None if self.stateful else make_key(data, self.fields, self.exclude)
+        if key is None:
+            return self.handler(data, context)
+
+        entry = self.cache.get(key)
+        if entry is not None:
+            MEMO_HITS.inc()
+            return entry[1]
+        MEMO_MISSES.inc()
+
+        env = context.env
+        tracker = context.env = EnvAccessTracker(env)
+        try:
+            output = self.handler(data, context)
+        finally:
+            context.env = env
+        if tracker.touched:
+            # Its output depends on context.env, caching it would be wrong
+            self.stateful = True
+            logger.warning("[WARNING] The memoized handler uses context.env, memoization disabled for it")
+        else:
+            self.cache.put(key, output)
+        return output
+
+    def close(self):
+        close = getattr(self.handler, "close", None)
+        if close is not None:
+            close()
+
+def memoize_handler(handler):
+    if handler is None or inspect.iscoroutinefunction(handler):
+        return handler
+    options = get_memoize_options(handler)
+    if options is None:
+        return handler
+    logger.info(f"[INFO] Memoizing the handler (max {MEMO_MAX_ENTRIES} entries, TTL {MEMO_TTL}s)")
+    return MemoizedHandler(handler, options.get("fields"), options.get("exclude"))
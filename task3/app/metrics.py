@@ -0,0 +1,211 @@
+import cProfile
+import io
+import pstats
+import threading
+import time
+
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from logs import logger
+from local_env import METRICS_PORT, RUNTIME_PROFILER
+
+# Upper bounds (seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Counter:
+    def __init__(self, name, description):
+        self.name = name
+        self.description = description
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def take(self):
+        # What was counted since the last take, see take_metrics
+        with self.lock:
+            value, self.value = self.value, 0
+        return value
+
+    def merge(self, value):
+        self.inc(value)
+
+    def render(self):
+        return [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter", f"{self.name} {self.value}"]
+
+class Histogram:
+    # One set of buckets per value of the label (e.g. one per pipeline stage)
+    def __init__(self, name, description, label, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.label = label
+        self.buckets = buckets
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, label_value, value):
+        with self.lock:
+            series = self.series.get(label_value)
+            if series is None:
+                series = self.series[label_value] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][index] += 1
+                    break
+            series["sum"] += value
+            series["count"] += 1
+
+    def take(self):
+        with self.lock:
+            series, self.series = self.series, {}
+        return series
+
+    def merge(self, series):
+        with self.lock:
+            for label_value, taken in series.items():
+                current = self.series.get(label_value)
+                if current is None:
+                    self.series[label_value] = taken
+                    continue
+                current["counts"] = [count + added for count, added in zip(current["counts"], taken["counts"])]
+                current["sum"] += taken["sum"]
+                current["count"] += taken["count"]
+
+    @contextmanager
+    def time(self, label_value):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(label_value, time.perf_counter() - started)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for label_value, series in sorted(self.series.items()):
+                labels = f'{self.label}="{label_value}"'
+                cumulative = 0
+                for bound, count in zip(self.buckets, series["counts"]):
+                    cumulative += count
+                    lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {series["count"]}')
+                lines.append(f'{self.name}_sum{{{labels}}} {series["sum"]}')
+                lines.append(f'{self.name}_count{{{labels}}} {series["count"]}')
+        return lines
+
+STAGE_SECONDS = Histogram("runtime_stage_seconds", "Time spent in each stage of an invocation cycle", "stage")
+INVOCATIONS = Counter("runtime_invocations_total", "Handler invocations")
+HANDLER_ERRORS = Counter("runtime_handler_errors_total", "Handler invocations that raised or timed out")
+SKIPPED_INPUTS = Counter("runtime_skipped_inputs_total", "Cycles skipped because the input didn't change")
+PROCESSED_INPUTS = Counter("runtime_processed_inputs_total", "Inputs handed to the handler")
+SKIPPED_WRITES = Counter("runtime_skipped_writes_total", "Output writes skipped because the output didn't change")
+REDIS_ERRORS = Counter("runtime_redis_errors_total", "Redis commands that failed after retries")
+MEMO_HITS = Counter("runtime_memo_hits_total", "Invocations answered from the memoization cache")
+MEMO_MISSES = Counter("runtime_memo_misses_total", "Memoized invocations that ran the handler")
+MEMO_EVICTIONS = Counter("runtime_memo_evictions_total", "Memoized results evicted by size or TTL")
+WORKER_KILLS = Counter("runtime_worker_kills_total", "Handler worker processes killed (timeout, crash or memory limit)")
+WORKER_RECYCLES = Counter("runtime_worker_recycles_total", "Handler worker processes replaced after ISOLATION_MAX_INVOCATIONS")
+REGISTRY = [STAGE_SECONDS, INVOCATIONS, HANDLER_ERRORS, SKIPPED_INPUTS, PROCESSED_INPUTS, SKIPPED_WRITES, REDIS_ERRORS,
+            MEMO_HITS, MEMO_MISSES, MEMO_EVICTIONS, WORKER_KILLS, WORKER_RECYCLES]
+
+def take_metrics():
+    # Everything recorded since the last call (and resets it), so a handler worker process can send what it
+    # recorded back to the runtime, which serves the metrics. Only the metrics that changed are included
+    taken = {metric.name: metric.take() for metric in REGISTRY}
+    return {name: value for name, value in taken.items() if value}
+
+def merge_metrics(taken):
+    for metric in REGISTRY:
+        if metric.name in taken:
+            metric.merge(taken[metric.name])
+
+def render_metrics():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+class HandlerProfiler:
+    # Optional cProfile hook around the user handler, enabled with RUNTIME_PROFILER=cprofile or at runtime via /profile?enable=1
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.profile = cProfile.Profile()
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def profiling(self):
+        if not self.enabled:
+            yield
+            return
+        # cProfile can only profile one call at a time, concurrent invocations (async mode) are skipped
+        if not self.lock.acquire(blocking=False):
+            yield
+            return
+        try:
+            self.profile.enable()
+            try:
+                yield
+            finally:
+                self.profile.disable()
+        finally:
+            self.lock.release()
+
+    def set_enabled(self, enabled):
+        self.enabled = enabled
+
+    def reset(self):
+        with self.lock:
+            self.profile = cProfile.Profile()
+
+    def report(self, limit=40):
+        output = io.StringIO()
+        with self.lock:
+            try:
+                pstats.Stats(self.profile, stream=output).sort_stats("cumulative").print_stats(limit)
+            except TypeError:
+                output.write("No profile data collected yet.\n")
+        return output.getvalue()
+
+PROFILER = HandlerProfiler(enabled=RUNTIME_PROFILER == "cprofile")
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/metrics":
+            self.respond(render_metrics(), "text/plain; version=0.0.4")
+        elif url.path == "/profile":
+            query = parse_qs(url.query)
+            if "enable" in query:
+                PROFILER.set_enabled(query["enable"][0] == "1")
+            if "reset" in query:
+                PROFILER.reset()
+            self.respond(f"profiler enabled: {PROFILER.enabled}\n\n{PROFILER.report()}", "text/plain")
+        else:
+            self.send_error(404)
+
+    def respond(self, body, content_type):
+        payload = body.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        # Scrapes would flood the runtime logs
+        pass
+
+def start_metrics_server(port=METRICS_PORT):
+    if not port:
+        return None
+    try:
+        server = ThreadingHTTPServer(("0.0.0.0", port), MetricsRequestHandler)
+    except OSError as e:
+        logger.error(f"[ERROR] Failed to start the metrics endpoint on port {port}: {e}")
+        return None
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info(f"[INFO] Serving /metrics and /profile on port {port}")
+    return server
@@ -1,38 +1,167 @@
 import redis
-import json
+import redis.asyncio
+import redis.asyncio.retry
 
+from redis.client import NEVER_DECODE
+from redis.backoff import DecorrelatedJitterBackoff
+from redis.retry import Retry
 from logs import logger
-from local_env import REDIS_PORT, REDIS_HOST, REDIS_INPUT_KEY, REDIS_OUTPUT_KEY
+from local_env import *
+from metrics import STAGE_SECONDS, REDIS_ERRORS
+from serialization import decode_payload, encode_payload, DECODE_ERRORS, ENCODE_ERRORS
+
+def create_connection_pool(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True):
+    # Connection and timeout errors are retried with jittered exponential backoff on every command and pipeline
+    return redis.ConnectionPool(
+        host=host,
+        port=port,
+        decode_responses=decode_responses,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        socket_timeout=REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+        socket_keepalive=True,
+        health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
+        retry=Retry(DecorrelatedJitterBackoff(cap=REDIS_BACKOFF_CAP, base=REDIS_BACKOFF_BASE), REDIS_RETRIES),
+        retry_on_error=[redis.ConnectionError, redis.TimeoutError]
+    )
+
+def create_async_connection_pool(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True):
+    # Same settings as create_connection_pool, for the asyncio runtime
+    return redis.asyncio.ConnectionPool(
+        host=host,
+        port=port,
+        decode_responses=decode_responses,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        socket_timeout=REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+        socket_keepalive=True,
+        health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
+        retry=redis.asyncio.retry.Retry(DecorrelatedJitterBackoff(cap=REDIS_BACKOFF_CAP, base=REDIS_BACKOFF_BASE), REDIS_RETRIES),
+        retry_on_error=[redis.ConnectionError, redis.TimeoutError]
+    )
 
 def initialize_redis_client():
-    if not REDIS_INPUT_KEY:
-        logger.error("[ERROR] Environment variable 'REDIS_INPUT_KEY' must be set.")
+    if not (REDIS_INPUT_KEY or REDIS_INPUT_KEYS or REDIS_INPUT_PATTERN):
+        logger.error("[ERROR] One of the environment variables 'REDIS_INPUT_KEY', 'REDIS_INPUT_KEYS' or 'REDIS_INPUT_PATTERN' must be set.")
         return None
     if not REDIS_OUTPUT_KEY:
         logger.warning("[WARNING] Environment variable 'REDIS_OUTPUT_KEY' is not set. Output will not be stored in Redis.")
     try:
-        return redis.Redis(host=REDIS_HOST, port=REDIS_PORT, charset="utf-8", decode_responses=True)
+        return redis.Redis(connection_pool=create_connection_pool())
     except redis.RedisError as e:
         logger.error(f"[ERROR] Failed to connect to Redis: {e}")
         return None
 
-def fetch_data_from_redis(redis_client, key):
+def decode_data(key, data):
+    try:
+        with STAGE_SECONDS.time("decode"):
+            return decode_payload(data)
+    except DECODE_ERRORS as e:
+        logger.error(f"[ERROR] Error decoding payload for key '{key}': {e}")
+    return None
+
+def encode_data(key, data):
+    try:
+        with STAGE_SECONDS.time("encode"):
+            return encode_payload(data)
+    except ENCODE_ERRORS as e:
+        logger.error(f"[INFO] Error serializing data for key '{key}': {e}")
+    return None
+
+def get_raw(redis_client, key):
+    # Payloads are read as bytes even on decode_responses clients, since msgpack values aren't valid UTF-8
+    return redis_client.execute_command("GET", key, **{NEVER_DECODE: []})
+
+def mget_raw(redis_client, keys):
+    # Works for redis.asyncio clients too (returns an awaitable)
+    return redis_client.execute_command("MGET", *keys, **{NEVER_DECODE: []})
+
+def xread_raw(redis_client, key, last_id, block_ms):
+    return redis_client.execute_command("XREAD", "BLOCK", block_ms, "STREAMS", key, last_id, **{NEVER_DECODE: []})
+
+def xrange_raw(redis_client, key, start_id, end_id, count):
+    return redis_client.execute_command("XRANGE", key, start_id, end_id, "COUNT", count, **{NEVER_DECODE: []})
+
+def fetch_data_from_redis(redis_client, key, changes=None):
     try:
-        data = redis_client.get(key)
-        if data:
-            return json.loads(data)
-        logger.info(f"[INFO] No data found for key: {key}")
+        with STAGE_SECONDS.time("fetch"):
+            data = get_raw(redis_client, key)
+        if not data:
+            logger.info(f"[INFO] No data found for key: {key}")
+        elif changes is None or changes.input_changed(key, data):
+            return decode_data(key, data)
     except redis.RedisError as e:
+        REDIS_ERRORS.inc()
         logger.error(f"[ERROR] Redis error while fetching data for key '{key}': {e}")
-    except json.JSONDecodeError as e:
-        logger.error(f"[ERROR] Error decoding JSON for key '{key}': {e}")
     return None
 
-def store_data_in_redis(redis_client, key, data):
+def get_history_key(output_key):
+    return f"{output_key}{OUTPUT_HISTORY_SUFFIX}" if OUTPUT_HISTORY_MAXLEN else None
+
+def queue_output_writes(pipeline, encoded):
+    # The latest value of every output key, plus an entry in its capped history stream (the dashboard reads a
+    # bounded time range from it). Both go in the same pipeline, so there's no extra round trip
+    if len(encoded) == 1:
+        pipeline.set(*next(iter(encoded.items())))
+    else:
+        pipeline.mset(encoded)
+    for key, value in encoded.items():
+        history_key = get_history_key(key)
+        if history_key:
+            pipeline.xadd(history_key, {"data": value}, maxlen=OUTPUT_HISTORY_MAXLEN, approximate=True)
+    return pipeline
+
+def store_data_in_redis(redis_client, key, data, changes=None):
+    encoded = encode_data(key, data)
+    if encoded is None:
+        return
+    if changes is not None and not changes.output_changed(key, encoded):
+        return
     try:
-        redis_client.set(key, json.dumps(data))
+        with STAGE_SECONDS.time("store"):
+            queue_output_writes(redis_client.pipeline(transaction=False), {key: encoded}).execute()
         logger.info(f"[INFO] Data stored in Redis under key: {key}")
     except redis.RedisError as e:
+        if changes is not None:
+            changes.discard_output(key)
+        REDIS_ERRORS.inc()
         logger.error(f"[ERROR] Redis error while storing data for key '{key}': {e}")
-    except TypeError as e:
-        logger.error(f"[INFO] Error serializing data for key '{key}': {e}")
\ No newline at end of file
+
+def fetch_many_from_redis(redis_client, keys, changes=None):
+    # A single MGET round trip for all the keys, keys without (valid or new) data are left out
+    if not keys:
+        return {}
+    try:
+        with STAGE_SECONDS.time("fetch"):
+            values = mget_raw(redis_client, keys)
+    except redis.RedisError as e:
+        REDIS_ERRORS.inc()
+        logger.error(f"[ERROR] Redis error while fetching data for {len(keys)} keys: {e}")
+        return {}
+    result = {}
+    for key, value in zip(keys, values):
+        if value and (changes is None or changes.input_changed(key, value)):
+            data = decode_data(key, value)
+            if data:
+                result[key] = data
+    return result
+
+def store_many_in_redis(redis_client, outputs, changes=None):
+    # A single round trip for all the (changed) outputs
+    encoded = {}
+    for key, data in outputs.items():
+        value = encode_data(key, data)
+        if value is not None and (changes is None or changes.output_changed(key, value)):
+            encoded[key] = value
+    if not encoded:
+        return
+    try:
+        with STAGE_SECONDS.time("store"):
+            queue_output_writes(redis_client.pipeline(transaction=False), encoded).execute()
+        logger.info(f"[INFO] Data stored in Redis under {len(encoded)} keys")
+    except redis.RedisError as e:
+        if changes is not None:
+            for key in encoded:
+                changes.discard_output(key)
+        REDIS_ERRORS.inc()
+        logger.error(f"[ERROR] Redis error while storing data for {len(encoded)} keys: {e}")
@@ -0,0 +1,151 @@
+import collections
+import hashlib
+import importlib
+import os
+import sys
+import time
+
+from collections.abc import MutableMapping
+from logs import logger
+from local_env import *
+from handler import download_and_extract_zip, dynamic_import_from_dir, import_handler_from_file, wrap_handler
+
+def get_file_signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    # ConfigMap updates swap a symlink, so the inode changes even when the mtime doesn't
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+def hash_file(path):
+    try:
+        with open(path, "rb") as module_file:
+            return hashlib.sha256(module_file.read()).hexdigest()
+    except OSError:
+        return None
+
+def get_modules_from_dir(directory):
+    prefix = os.path.join(directory, "")
+    return {
+        name: module for name, module in list(sys.modules.items())
+        if (getattr(module, "__file__", None) or "").startswith(prefix)
+    }
+
+def migrate_objects(root, modules):
+    # Points the objects created by the previous version of the function at the classes of the new one,
+    # so the state kept in context.env survives the reload and is snapshotted with the new code
+    seen = set()
+    stack = [root]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        cls = type(obj)
+        module = modules.get(cls.__module__)
+        if module is not None:
+            new_cls = getattr(module, cls.__qualname__, None)
+            if isinstance(new_cls, type) and new_cls is not cls:
+                try:
+                    obj.__class__ = new_cls
+                except TypeError:
+                    pass
+            if hasattr(obj, "__dict__"):
+                stack.extend(vars(obj).values())
+        if isinstance(obj, (dict, MutableMapping)):
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset, collections.deque)):
+            stack.extend(obj)
+
+class HandlerReloader:
+    # Swaps in a new version of the user function without restarting the pod. The serve loops ask for the
+    # handler on every cycle, the source is only checked every `check_cycles` cycles (a stat() for
+    # usermodule.py, a conditional GET at most every `zip_period` seconds for ZIPFILE_URL)
+    def __init__(self, handler, source, check_cycles=FUNCTION_RELOAD_CYCLES, zip_period=ZIPFILE_RELOAD_PERIOD):
+        self.handler = handler
+        self.source_type, self.location = source
+        self.check_cycles = check_cycles
+        self.zip_period = zip_period
+        self.generation = 0
+        self.modules = {}
+        self.cycles = 0
+        self.next_zip_check = time.monotonic() + zip_period
+        self.failed_version = None
+        if self.source_type == "file":
+            self.file_signature = get_file_signature(self.location)
+            self.file_hash = hash_file(self.location)
+
+    def get_handler(self):
+        if not self.check_cycles or not self.source_type:
+            return self.handler
+        self.cycles += 1
+        if self.cycles % self.check_cycles == 0:
+            if self.source_type == "file":
+                self.check_file()
+            elif time.monotonic() >= self.next_zip_check:
+                self.next_zip_check = time.monotonic() + self.zip_period
+                self.check_zip()
+        return self.handler
+
+    def check_file(self):
+        signature = get_file_signature(self.location)
+        if signature is None or signature == self.file_signature:
+            return
+        self.file_signature = signature
+        # A touch or a ConfigMap resync with the same content isn't a new version
+        file_hash = hash_file(self.location)
+        if file_hash in (self.file_hash, self.failed_version):
+            return
+
+        old_module = sys.modules.get("usermodule")
+        handler = import_handler_from_file(self.location, FUNCTION_HANDLER)
+        if handler is None:
+            # Keep serving the previous version, and don't retry until the file changes again
+            if old_module is not None:
+                sys.modules["usermodule"] = old_module
+            self.failed_version = file_hash
+            logger.error(f"[ERROR] Reloading {self.location} failed, keeping the previous handler")
+            return
+        self.file_hash = file_hash
+        self.swap(handler, {"usermodule": sys.modules["usermodule"]})
+
+    def check_zip(self):
+        # Answered with a 304 (and no download) while the archive doesn't change
+        extracted_dir = download_and_extract_zip(ZIPFILE_URL)
+        if not extracted_dir or extracted_dir in (self.location, self.failed_version):
+            return
+
+        # Modules are imported by name, the old ones have to leave sys.modules for the new tree to be imported
+        old_modules = get_modules_from_dir(self.location) if self.location else {}
+        for name in old_modules:
+            del sys.modules[name]
+        importlib.invalidate_caches()
+        handler = dynamic_import_from_dir(extracted_dir, FUNCTION_HANDLER)
+        if handler is None:
+            for name in get_modules_from_dir(extracted_dir):
+                del sys.modules[name]
+            sys.modules.update(old_modules)
+            self.failed_version = extracted_dir
+            logger.error(f"[ERROR] Reloading {ZIPFILE_URL} failed, keeping the previous handler")
+            return
+        self.location = extracted_dir
+        self.swap(handler, get_modules_from_dir(extracted_dir))
+
+    def swap(self, handler, modules):
+        close = getattr(self.handler, "close", None)
+        if close is not None:
+            close()
+        self.handler = wrap_handler(handler)
+        self.modules.update(modules)
+        self.generation += 1
+        logger.info(f"[INFO] Reloaded the handler from {self.location} (version {self.generation})")
+
+    def migrate(self, context):
+        # Called by whoever owns the context, right before invoking the handler with it
+        if context.handler_generation == self.generation:
+            return
+        context.handler_generation = self.generation
+        migrate_objects(context.env, self.modules)
+        if self.source_type == "file":
+            context.update_function_getmtime()
@@ -0,0 +1,141 @@
+"""Replays recorded 'metrics' snapshots through the handler as fast as possible.
+
+Examples:
+    python replay.py --file metrics.jsonl --output-file outputs.jsonl
+    python replay.py --stream metrics-history --output-stream proj3-output-backfill --set-output-key
+    python replay.py --file metrics.jsonl --module /tmp/new_usermodule.py --quiet
+
+Snapshots must be in chronological order, the handler windows are driven by their 'timestamp' field.
+"""
+import argparse
+import json
+import logging
+import time
+
+from redis_utils import *
+from handler import get_handler, execute_handler, import_handler_from_file
+from local_env import *
+from context import Context
+
+def read_jsonl(path):
+    with open(path) as file:
+        for line_number, line in enumerate(file, 1):
+            line = line.strip()
+            if not line:
+                continue
+            data = decode_data(f"{path}:{line_number}", line)
+            if data:
+                yield data
+
+def read_stream(redis_client, key, start_id="-", end_id="+", batch_size=1000):
+    while True:
+        entries = xrange_raw(redis_client, key, start_id, end_id, batch_size)
+        for message_id, fields in entries:
+            raw = fields.get(REDIS_STREAM_FIELD.encode())
+            data = decode_data(f"{key}:{message_id.decode()}", raw) if raw else None
+            if data:
+                yield data
+        if len(entries) < batch_size:
+            return
+        # Continue right after the last entry read (exclusive range)
+        start_id = f"({entries[-1][0].decode()}"
+
+class OutputWriter:
+    def __init__(self, redis_client=None, output_file=None, output_stream=None, batch_size=1000):
+        self.redis_client = redis_client
+        self.output_file = open(output_file, "w") if output_file else None
+        self.output_stream = output_stream
+        self.batch_size = batch_size
+        self.pending = []
+        self.last_output = None
+
+    def write(self, data, output):
+        self.pending.append((data.get("timestamp", ""), output))
+        self.last_output = output
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        if self.output_file:
+            self.output_file.writelines(json.dumps(output) + "\n" for _, output in self.pending)
+        if self.output_stream:
+            # One round trip for the whole batch
+            pipeline = self.redis_client.pipeline(transaction=False)
+            for timestamp, output in self.pending:
+                encoded = encode_data(self.output_stream, output)
+                if encoded is not None:
+                    pipeline.xadd(self.output_stream, {"data": encoded, "timestamp": timestamp})
+            pipeline.execute()
+        self.pending = []
+
+    def close(self):
+        self.flush()
+        if self.output_file:
+            self.output_file.close()
+
+def replay(handler, inputs, context, writer):
+    events = 0
+    errors = 0
+    started = time.perf_counter()
+    for data in inputs:
+        events += 1
+        if not data.get("timestamp"):
+            logger.warning("[WARNING] Snapshot without 'timestamp', the handler will use the current time.")
+        output = execute_handler(handler, data, context)
+        if output:
+            writer.write(data, output)
+        else:
+            errors += 1
+    writer.close()
+    return events, errors, time.perf_counter() - started
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded metrics snapshots through the handler.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--file", help="JSONL file with one snapshot per line")
+    source.add_argument("--stream", help=f"Redis stream with one snapshot per entry (field '{REDIS_STREAM_FIELD}')")
+    parser.add_argument("--start-id", default="-", help="first stream entry id to replay")
+    parser.add_argument("--end-id", default="+", help="last stream entry id to replay")
+    parser.add_argument("--module", help="load the handler from this file instead of the runtime configuration")
+    parser.add_argument("--output-file", help="write the outputs to this JSONL file")
+    parser.add_argument("--output-stream", help="append the outputs to this Redis stream")
+    parser.add_argument("--set-output-key", action="store_true", help="store the last output under REDIS_OUTPUT_KEY")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--quiet", action="store_true", help="only log warnings and errors (handlers log every call)")
+    args = parser.parse_args()
+
+    if args.quiet:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    redis_client = None
+    if args.stream or args.output_stream or args.set_output_key:
+        redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+
+    handler = import_handler_from_file(args.module, FUNCTION_HANDLER) if args.module else get_handler()
+    if not handler:
+        logger.error("[ERROR] No valid serverless function entrypoint found. Exiting.")
+        exit(1)
+
+    # A fresh context, so the windows only contain the replayed snapshots
+    context = Context(
+        host=REDIS_HOST,
+        port=REDIS_PORT,
+        input_key=args.stream or args.file,
+        output_key=args.output_stream or REDIS_OUTPUT_KEY
+    )
+
+    if args.file:
+        inputs = read_jsonl(args.file)
+    else:
+        inputs = read_stream(redis_client, args.stream, args.start_id, args.end_id, args.batch_size)
+    writer = OutputWriter(redis_client, args.output_file, args.output_stream, args.batch_size)
+
+    events, errors, elapsed = replay(handler, inputs, context, writer)
+
+    if args.set_output_key and writer.last_output and REDIS_OUTPUT_KEY:
+        store_data_in_redis(redis_client, REDIS_OUTPUT_KEY, writer.last_output)
+
+    rate = events / elapsed if elapsed else 0.0
+    print(f"Replayed {events} events in {elapsed:.3f}s ({rate:.1f} events/s), {errors} without output")
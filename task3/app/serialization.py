@@ -0,0 +1,80 @@
+import json
+
+from logs import logger
+from local_env import PAYLOAD_CODEC
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Raised by any of the codecs on malformed payloads (JSONDecodeError, UnicodeDecodeError and the msgpack errors
+# are ValueErrors) and on unserializable outputs
+DECODE_ERRORS = (ValueError, TypeError)
+ENCODE_ERRORS = (ValueError, TypeError)
+
+class JsonCodec:
+    # Default, byte for byte what the runtime always wrote
+    name = "json"
+
+    def encode(self, data):
+        return json.dumps(data)
+
+    def decode(self, raw):
+        return json.loads(raw)
+
+class OrjsonCodec:
+    # Same wire format (compact JSON), several times faster on wide payloads
+    name = "orjson"
+
+    def encode(self, data):
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+
+    def decode(self, raw):
+        return orjson.loads(raw)
+
+class MsgpackCodec:
+    # Binary, smaller payloads; readers need the msgpack package too
+    name = "msgpack"
+
+    def encode(self, data):
+        return msgpack.packb(data, use_bin_type=True)
+
+    def decode(self, raw):
+        return msgpack.unpackb(raw, raw=False)
+
+def get_codec(name=PAYLOAD_CODEC):
+    if name == "orjson" and orjson is not None:
+        return OrjsonCodec()
+    if name == "msgpack" and msgpack is not None:
+        return MsgpackCodec()
+    if name != "json":
+        logger.warning(f"[WARNING] Payload codec '{name}' is unknown or not installed, falling back to json")
+    return JsonCodec()
+
+CODEC = get_codec()
+# JSON payloads are read with orjson only when it was selected: it rejects NaN/Infinity and integers wider than
+# 64 bits, which json (and the producers writing with it) accept
+JSON_DECODER = CODEC if isinstance(CODEC, OrjsonCodec) else JsonCodec()
+
+def is_json(raw):
+    # JSON documents start with '{' or '[' (a msgpack map or array never does), so readers don't need to know
+    # which codec wrote a value and inputs/outputs can be migrated one producer at a time
+    if isinstance(raw, str):
+        return True
+    return raw.lstrip()[:1] in (b"{", b"[")
+
+def decode_payload(raw):
+    if is_json(raw):
+        return JSON_DECODER.decode(raw)
+    if msgpack is None:
+        raise ValueError("payload isn't JSON and msgpack is not installed")
+    return msgpack.unpackb(raw, raw=False)
+
+def encode_payload(data):
+    return CODEC.encode(data)
@@ -0,0 +1,151 @@
+import hashlib
+import multiprocessing
+import socket
+import time
+import redis
+
+from logs import logger
+from metrics import REDIS_ERRORS, start_metrics_server
+from local_env import *
+from redis_utils import initialize_redis_client, fetch_many_from_redis, store_many_in_redis
+from handler import execute_handler
+from context import Context
+from state import create_state_backend
+from change_detection import ChangeDetector
+from chaining import get_outputs
+
+def is_sharded():
+    return bool(REDIS_INPUT_KEYS or REDIS_INPUT_PATTERN)
+
+def get_replica_index():
+    if REPLICA_INDEX is not None:
+        return int(REPLICA_INDEX)
+    # StatefulSet pods are named <statefulset>-<ordinal>
+    ordinal = socket.gethostname().rsplit("-", 1)[-1]
+    return int(ordinal) if ordinal.isdigit() else 0
+
+def get_output_key(input_key):
+    if not REDIS_OUTPUT_KEY:
+        return None
+    if "{key}" in REDIS_OUTPUT_KEY:
+        return REDIS_OUTPUT_KEY.replace("{key}", input_key)
+    if is_sharded():
+        return f"{REDIS_OUTPUT_KEY}:{input_key}"
+    return REDIS_OUTPUT_KEY
+
+def get_owner(key, buckets, salt):
+    # Rendezvous (highest random weight) hashing: resizing only moves the keys of the added/removed bucket
+    def weight(bucket):
+        digest = hashlib.blake2b(f"{salt}{bucket}:{key}".encode(), digest_size=8).digest()
+        return int.from_bytes(digest, "big")
+    return max(range(buckets), key=weight)
+
+def owns_key(key, replica_index, replica_count, worker_index, worker_count):
+    return (get_owner(key, replica_count, "replica") == replica_index
+            and get_owner(key, worker_count, "worker") == worker_index)
+
+def discover_keys(redis_client):
+    if REDIS_INPUT_KEYS:
+        return [key.strip() for key in REDIS_INPUT_KEYS.split(",") if key.strip()]
+    if REDIS_INPUT_PATTERN:
+        try:
+            # Only string keys, so state hashes and streams matching the pattern are left alone
+            return sorted(set(redis_client.scan_iter(match=REDIS_INPUT_PATTERN, count=1000, _type="STRING")))
+        except redis.RedisError as e:
+            REDIS_ERRORS.inc()
+            logger.error(f"[ERROR] Redis error while scanning keys matching '{REDIS_INPUT_PATTERN}': {e}")
+            return None
+    return [REDIS_INPUT_KEY]
+
+def create_context(input_key):
+    output_key = get_output_key(input_key)
+    return Context(
+        host=REDIS_HOST,
+        port=REDIS_PORT,
+        input_key=input_key,
+        output_key=output_key,
+        state_backend=create_state_backend(REDIS_HOST, REDIS_PORT, input_key, output_key, per_key=True)
+    )
+
+def update_contexts(contexts, keys, changes=None):
+    # One Context per input key, so each key keeps its own window state
+    for key in set(contexts) - set(keys):
+        context = contexts.pop(key)
+        context.save_state(force=True)
+        if changes is not None:
+            changes.forget(key)
+            changes.forget(context.output_key)
+    for key in keys:
+        if key not in contexts:
+            contexts[key] = create_context(key)
+            if changes is not None:
+                changes.restore_input(key, contexts[key].input_fingerprint)
+
+def run_worker(reloader, replica_index, replica_count, worker_index, worker_count, period=REDIS_MONITORING_PERIOD, metrics_port=None):
+    redis_client = initialize_redis_client()
+    if not redis_client:
+        return
+    if metrics_port:
+        start_metrics_server(metrics_port)
+
+    contexts = {}
+    changes = ChangeDetector()
+    next_discovery = 0
+    try:
+        while True:
+            if time.monotonic() >= next_discovery:
+                keys = discover_keys(redis_client)
+                if keys is not None:
+                    owned_keys = [key for key in keys if owns_key(key, replica_index, replica_count, worker_index, worker_count)]
+                    update_contexts(contexts, owned_keys, changes)
+                    logger.info(f"[INFO] Worker {replica_index}.{worker_index} owns {len(contexts)} of {len(keys)} input keys")
+                next_discovery = time.monotonic() + KEY_DISCOVERY_PERIOD
+
+            # One round trip to read every owned key and another one to write all the outputs
+            inputs = fetch_many_from_redis(redis_client, list(contexts), changes)
+            outputs = {}
+            handler = reloader.get_handler()
+            for key, data in inputs.items():
+                context = contexts[key]
+                reloader.migrate(context)
+                output = execute_handler(handler, data, context)
+                context.input_fingerprint = changes.last_input(key)
+                if output and context.output_key:
+                    outputs.update(get_outputs(context, output))
+                context.save_state()
+            store_many_in_redis(redis_client, outputs, changes)
+            time.sleep(period)
+    finally:
+        for context in contexts.values():
+            context.save_state(force=True)
+
+def serve_sharded(reloader):
+    replica_index = get_replica_index()
+    logger.info(f"[INFO] Replica {replica_index} of {REPLICA_COUNT}, running {RUNTIME_WORKERS} worker(s)")
+    if RUNTIME_WORKERS <= 1:
+        run_worker(reloader, replica_index, REPLICA_COUNT, 0, 1)
+        return
+
+    # The handler is already imported, forked workers start warm (and then reload it on their own).
+    # Each worker serves its own metrics on METRICS_PORT + worker index
+    ctx = multiprocessing.get_context("fork")
+    def start_worker(worker_index):
+        metrics_port = METRICS_PORT + worker_index if METRICS_PORT else None
+        process = ctx.Process(target=run_worker, args=(reloader, replica_index, REPLICA_COUNT, worker_index, RUNTIME_WORKERS, REDIS_MONITORING_PERIOD, metrics_port), daemon=True)
+        process.start()
+        return process
+
+    workers = [start_worker(worker_index) for worker_index in range(RUNTIME_WORKERS)]
+    try:
+        while True:
+            for worker_index, process in enumerate(workers):
+                if not process.is_alive():
+                    logger.error(f"[ERROR] Worker {worker_index} exited with code {process.exitcode}, restarting it")
+                    workers[worker_index] = start_worker(worker_index)
+            time.sleep(1)
+    finally:
+        # Let the workers snapshot their contexts before exiting
+        for process in workers:
+            process.terminate()
+        for process in workers:
+            process.join()
@@ -0,0 +1,246 @@
+import collections
+import datetime
+import sys
+import time
+import zlib
+import redis
+
+from collections.abc import MutableMapping
+from logs import logger
+from metrics import REDIS_ERRORS
+from redis_utils import create_connection_pool
+from local_env import CONTEXT_STATE_BACKEND, CONTEXT_STATE_KEY, CONTEXT_SNAPSHOT_PERIOD
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Snapshots are data only (msgpack plus a few extension types), so a snapshot read from Redis can't run code when
+# it's restored. Besides the msgpack types, env values can hold tuples, sets, deques, datetimes, timedeltas, NumPy
+# arrays and objects of classes that opt in with `to_state()` (plain data) and a `from_state(state)` classmethod
+EXT_TUPLE = 1
+EXT_SET = 2
+EXT_DEQUE = 3
+EXT_DATETIME = 4
+EXT_TIMEDELTA = 5
+EXT_NDARRAY = 6
+EXT_OBJECT = 7
+
+def pack(value):
+    return msgpack.packb(value, default=encode_ext, use_bin_type=True, strict_types=True)
+
+def encode_ext(value):
+    if isinstance(value, tuple):
+        return msgpack.ExtType(EXT_TUPLE, pack(list(value)))
+    if isinstance(value, (set, frozenset)):
+        return msgpack.ExtType(EXT_SET, pack(list(value)))
+    if isinstance(value, collections.deque):
+        return msgpack.ExtType(EXT_DEQUE, pack([value.maxlen, list(value)]))
+    if isinstance(value, datetime.datetime):
+        return msgpack.ExtType(EXT_DATETIME, value.isoformat().encode())
+    if isinstance(value, datetime.timedelta):
+        return msgpack.ExtType(EXT_TIMEDELTA, pack([value.days, value.seconds, value.microseconds]))
+    if np is not None and isinstance(value, np.ndarray) and not value.dtype.hasobject:
+        return msgpack.ExtType(EXT_NDARRAY, pack([value.dtype.str, list(value.shape), np.ascontiguousarray(value).tobytes()]))
+    if np is not None and isinstance(value, np.generic):
+        return value.item()
+    if hasattr(value, "to_state") and hasattr(type(value), "from_state"):
+        cls = type(value)
+        return msgpack.ExtType(EXT_OBJECT, pack([cls.__module__, cls.__qualname__, value.to_state()]))
+    # Subclasses of the msgpack types (e.g. defaultdict) end up here with strict_types, they'd come back as the base type
+    raise TypeError(f"can't snapshot a value of type {type(value).__name__}")
+
+def unpack(raw):
+    return msgpack.unpackb(raw, ext_hook=decode_ext, raw=False, strict_map_key=False)
+
+def decode_ext(code, data):
+    if code == EXT_TUPLE:
+        return tuple(unpack(data))
+    if code == EXT_SET:
+        return set(unpack(data))
+    if code == EXT_DEQUE:
+        maxlen, items = unpack(data)
+        return collections.deque(items, maxlen)
+    if code == EXT_DATETIME:
+        return datetime.datetime.fromisoformat(data.decode())
+    if code == EXT_TIMEDELTA:
+        return datetime.timedelta(*unpack(data))
+    if code == EXT_NDARRAY:
+        if np is None:
+            raise ValueError("the snapshot holds a NumPy array and NumPy is not installed")
+        dtype, shape, buffer = unpack(data)
+        return np.frombuffer(buffer, dtype=np.dtype(dtype)).reshape(shape).copy()
+    if code == EXT_OBJECT:
+        module_name, qualname, state = unpack(data)
+        # Only classes of modules the runtime already imported, nothing gets imported or called besides from_state
+        cls = sys.modules.get(module_name)
+        for name in qualname.split("."):
+            cls = getattr(cls, name, None)
+        if not isinstance(cls, type) or not hasattr(cls, "from_state"):
+            raise ValueError(f"'{module_name}.{qualname}' isn't a loaded class with from_state")
+        return cls.from_state(state)
+    raise ValueError(f"unknown snapshot extension type {code}")
+
+def encode_value(value):
+    # zlib keeps snapshots small
+    return zlib.compress(pack(value), 1)
+
+def decode_value(raw):
+    return unpack(zlib.decompress(raw))
+
+# Dict-like Context.env that tracks which keys changed since the last snapshot.
+# Restored values are kept encoded and only decoded the first time the handler reads them
+class StateEnv(MutableMapping):
+    def __init__(self, snapshot=None):
+        self.data = {}
+        self.snapshot = snapshot or {}
+        self.dirty = set()
+        self.deleted = set()
+
+    def restore(self, key):
+        raw = self.snapshot.pop(key)
+        try:
+            self.data[key] = decode_value(raw)
+        except Exception as e:
+            logger.error(f"[ERROR] Failed to restore context key '{key}', dropping it: {e}")
+
+    def __getitem__(self, key):
+        if key in self.snapshot:
+            self.restore(key)
+        value = self.data[key]
+        # Values are usually mutated in place (e.g. context.env["cpu_windows"][key].push(...)), so a read counts as a change
+        self.dirty.add(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.snapshot.pop(key, None)
+        self.data[key] = value
+        self.dirty.add(key)
+        self.deleted.discard(key)
+
+    def __delitem__(self, key):
+        if key in self.snapshot:
+            del self.snapshot[key]
+        else:
+            del self.data[key]
+        self.dirty.discard(key)
+        self.deleted.add(key)
+
+    def __contains__(self, key):
+        if key in self.snapshot:
+            self.restore(key)
+        return key in self.data
+
+    def __iter__(self):
+        return iter(list(self.data) + list(self.snapshot))
+
+    def __len__(self):
+        return len(self.data) + len(self.snapshot)
+
+    def pop_changes(self):
+        changed = {key: self.data[key] for key in self.dirty if key in self.data}
+        deleted = self.deleted
+        self.dirty = set()
+        self.deleted = set()
+        return changed, deleted
+
+# Hash field of the fingerprint of the last input the snapshot includes, next to the env keys
+INPUT_FINGERPRINT_FIELD = "__input_fingerprint__"
+
+# Keeps Context.env in the process only, it is lost on restart
+class MemoryStateBackend:
+    input_fingerprint = None
+
+    def restore(self):
+        return {}
+
+    def save(self, env, force=False, input_fingerprint=None):
+        pass
+
+# Keeps Context.env in a Redis hash (one field per env key), flushing only the changed keys
+class RedisStateBackend:
+    # Connection pools shared by the backends of every context, by (host, port)
+    pools = {}
+
+    def __init__(self, host, port, key, snapshot_period=CONTEXT_SNAPSHOT_PERIOD):
+        # Snapshots are binary, so this client doesn't decode responses
+        pool = self.pools.get((host, port))
+        if pool is None:
+            pool = self.pools[(host, port)] = create_connection_pool(host, port, decode_responses=False)
+        self.redis_client = redis.Redis(connection_pool=pool)
+        self.key = key
+        self.snapshot_period = snapshot_period
+        self.last_snapshot = time.monotonic()
+        # Restored with the env, so a restarted runtime doesn't hand the handler an input it already processed
+        self.input_fingerprint = None
+
+    def restore(self):
+        try:
+            snapshot = self.redis_client.hgetall(self.key)
+        except redis.RedisError as e:
+            REDIS_ERRORS.inc()
+            logger.error(f"[ERROR] Redis error while restoring context from '{self.key}': {e}")
+            snapshot = {}
+        self.input_fingerprint = snapshot.pop(INPUT_FINGERPRINT_FIELD.encode(), None)
+        logger.info(f"[INFO] Restored {len(snapshot)} context keys from: {self.key}")
+        return StateEnv({field.decode(): value for field, value in snapshot.items()})
+
+    def save(self, env, force=False, input_fingerprint=None):
+        # Called after every invocation, but only goes to Redis once per snapshot period
+        now = time.monotonic()
+        if not force and now - self.last_snapshot < self.snapshot_period:
+            return
+        self.last_snapshot = now
+
+        changed, deleted = env.pop_changes()
+        encoded = {}
+        for key, value in changed.items():
+            try:
+                encoded[key] = encode_value(value)
+            except Exception as e:
+                logger.error(f"[ERROR] Failed to snapshot context key '{key}': {e}")
+        fingerprint_changed = input_fingerprint is not None and input_fingerprint != self.input_fingerprint
+        if fingerprint_changed:
+            encoded[INPUT_FINGERPRINT_FIELD] = input_fingerprint
+        if not encoded and not deleted:
+            return
+
+        try:
+            pipeline = self.redis_client.pipeline(transaction=False)
+            if encoded:
+                pipeline.hset(self.key, mapping=encoded)
+            if deleted:
+                pipeline.hdel(self.key, *deleted)
+            pipeline.execute()
+            if fingerprint_changed:
+                self.input_fingerprint = input_fingerprint
+            logger.info(f"[INFO] Context snapshot stored in Redis under key: {self.key} ({len(encoded)} changed, {len(deleted)} deleted)")
+        except redis.RedisError as e:
+            REDIS_ERRORS.inc()
+            logger.error(f"[ERROR] Redis error while storing context snapshot '{self.key}': {e}")
+            # Try again on the next snapshot
+            env.dirty.update(changed)
+            env.deleted.update(deleted)
+
+def get_state_key(input_key, output_key, per_key=False):
+    # With one context per input key (sharded and asyncio runtimes) CONTEXT_STATE_KEY is a prefix, a single
+    # hash would make every context read and overwrite the same fields
+    if CONTEXT_STATE_KEY and per_key:
+        return f"{CONTEXT_STATE_KEY}:{output_key or input_key}"
+    return CONTEXT_STATE_KEY or f"{output_key or input_key}-context"
+
+def create_state_backend(host, port, input_key, output_key, per_key=False):
+    if CONTEXT_STATE_BACKEND == "redis":
+        if msgpack is not None:
+            return RedisStateBackend(host, port, get_state_key(input_key, output_key, per_key))
+        logger.warning("[WARNING] msgpack is not installed, keeping the context in memory")
+        return MemoryStateBackend()
+    if CONTEXT_STATE_BACKEND != "memory":
+        logger.warning(f"[WARNING] Unknown context state backend '{CONTEXT_STATE_BACKEND}', keeping the context in memory")
+    return MemoryStateBackend()
@@ -0,0 +1,107 @@
+import time
+import redis
+
+from logs import logger
+from metrics import REDIS_ERRORS
+from local_env import REDIS_MONITORING_PERIOD, REDIS_TRIGGER_MODE, REDIS_STREAM_FIELD
+from redis_utils import fetch_data_from_redis, decode_data, xread_raw
+
+# Keyspace events that leave a new value behind the key (anything else, e.g. del/expired, is ignored)
+IGNORED_KEYSPACE_EVENTS = {"del", "expired", "evicted"}
+
+def poll_inputs(redis_client, key, period=REDIS_MONITORING_PERIOD, changes=None):
+    while True:
+        data = fetch_data_from_redis(redis_client, key, changes)
+        if data:
+            yield data
+        time.sleep(period)
+
+def enable_keyspace_notifications(redis_client):
+    # Keyspace notifications are disabled by default, we need at least 'K' (keyspace channel) and '$' (string commands)
+    try:
+        flags = redis_client.config_get("notify-keyspace-events").get("notify-keyspace-events", "")
+        if "K" in flags and ("$" in flags or "A" in flags):
+            return True
+        redis_client.config_set("notify-keyspace-events", "".join(sorted(set(flags + "K$"))))
+        return True
+    except redis.RedisError as e:
+        REDIS_ERRORS.inc()
+        logger.warning(f"[WARNING] Could not enable keyspace notifications: {e}")
+        return False
+
+def drain_keyspace_events(pubsub):
+    # Several SETs may arrive while the handler runs; we only need to read the latest value once
+    changed = False
+    message = pubsub.get_message(timeout=0)
+    while message:
+        changed = changed or message["data"] not in IGNORED_KEYSPACE_EVENTS
+        message = pubsub.get_message(timeout=0)
+    return changed
+
+def keyspace_inputs(redis_client, key, period=REDIS_MONITORING_PERIOD, changes=None):
+    db = redis_client.connection_pool.connection_kwargs.get("db", 0)
+    channel = f"__keyspace@{db}__:{key}"
+    while True:
+        pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+        try:
+            pubsub.subscribe(channel)
+            logger.info(f"[INFO] Subscribed to keyspace notifications on: {channel}")
+
+            # Process whatever was already there before we subscribed
+            data = fetch_data_from_redis(redis_client, key, changes)
+            if data:
+                yield data
+
+            while True:
+                message = pubsub.get_message(timeout=period)
+                if not message:
+                    continue
+                changed = message["data"] not in IGNORED_KEYSPACE_EVENTS
+                if not (drain_keyspace_events(pubsub) or changed):
+                    continue
+                # A SET rewriting the same value still fires an event
+                data = fetch_data_from_redis(redis_client, key, changes)
+                if data:
+                    yield data
+        except redis.RedisError as e:
+            REDIS_ERRORS.inc()
+            logger.error(f"[ERROR] Redis error while waiting for keyspace notifications on '{key}': {e}")
+            time.sleep(period)
+        finally:
+            pubsub.close()
+
+def stream_inputs(redis_client, key, period=REDIS_MONITORING_PERIOD, field=REDIS_STREAM_FIELD):
+    # Only entries added after startup are processed
+    last_id = "$"
+    while True:
+        try:
+            entries = xread_raw(redis_client, key, last_id, int(period * 1000))
+        except redis.RedisError as e:
+            REDIS_ERRORS.inc()
+            logger.error(f"[ERROR] Redis error while reading stream '{key}': {e}")
+            time.sleep(period)
+            continue
+        for _, messages in entries or []:
+            # Entries are read undecoded (the payload may be msgpack), so ids and field names are bytes
+            for message_id, fields in messages:
+                last_id = message_id
+                raw = fields.get(field.encode())
+                if not raw:
+                    message_id = message_id.decode()
+                    logger.warning(f"[WARNING] Stream entry {message_id} has no '{field}' field, skipping.")
+                    continue
+                data = decode_data(key, raw)
+                if data:
+                    yield data
+
+def get_inputs(redis_client, key, mode=REDIS_TRIGGER_MODE, period=REDIS_MONITORING_PERIOD, changes=None):
+    # Stream entries are new inputs by definition, only the polling and keyspace triggers re-read unchanged values
+    if mode == "keyspace":
+        if enable_keyspace_notifications(redis_client):
+            return keyspace_inputs(redis_client, key, period, changes)
+        logger.warning("[WARNING] Falling back to polling mode")
+    elif mode == "stream":
+        return stream_inputs(redis_client, key, period)
+    elif mode != "poll":
+        logger.warning(f"[WARNING] Unknown trigger mode '{mode}', falling back to polling mode")
+    return poll_inputs(redis_client, key, period, changes)
@@ -3,15 +3,29 @@ import json
 import time
 import logging
 import redis
+from redis.client import NEVER_DECODE
 from datetime import datetime
 import importlib.util
 
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
 REDIS_HOST = os.getenv('REDIS_HOST', '192.168.121.187')
 REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
 REDIS_INPUT_KEY = os.getenv('REDIS_INPUT_KEY')
 REDIS_OUTPUT_KEY = os.getenv('REDIS_OUTPUT_KEY')
 REDIS_MONITORING_PERIOD = int(os.getenv('REDIS_MONITORING_PERIOD', 5))
 FUNCTION_HANDLER = os.getenv('FUNCTION_HANDLER', 'handler')
+REDIS_TRIGGER_MODE = os.getenv('REDIS_TRIGGER_MODE', 'poll')
+REDIS_STREAM_FIELD = os.getenv('REDIS_STREAM_FIELD', 'data')
+# Every output is also appended to a capped stream, the dashboard's line chart reads it (0 disables it)
+OUTPUT_HISTORY_MAXLEN = int(os.getenv('OUTPUT_HISTORY_MAXLEN', 17280))
+OUTPUT_HISTORY_SUFFIX = os.getenv('OUTPUT_HISTORY_SUFFIX', '-history')
+
+# Keyspace events that leave a new value behind the key (anything else, e.g. del/expired, is ignored)
+IGNORED_KEYSPACE_EVENTS = {"del", "expired", "evicted"}
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -56,27 +70,135 @@ def load_user_module():
         logger.error(f"[ERROR] Error loading 'usermodule': {e}")
         return None
 
+def decode_data(key, data):
+    # Payloads starting with '{' or '[' are JSON, anything else is msgpack (see app/serialization.py)
+    try:
+        if isinstance(data, str) or data.lstrip()[:1] in (b"{", b"["):
+            return json.loads(data)
+        if msgpack is None:
+            raise ValueError("payload isn't JSON and msgpack is not installed")
+        return msgpack.unpackb(data, raw=False)
+    except (ValueError, TypeError) as e:
+        logger.error(f"[ERROR]  Error decoding payload for key '{key}': {e}")
+    return None
+
 def fetch_data_from_redis(redis_client, key):
     try:
-        data = redis_client.get(key)
+        # Read as bytes, msgpack payloads aren't valid UTF-8
+        data = redis_client.execute_command("GET", key, **{NEVER_DECODE: []})
         if data:
-            return json.loads(data)
+            return decode_data(key, data)
         logger.info(f"[INFO]  No data found for key: {key}")
     except redis.RedisError as e:
         logger.error(f"[ERROR] Redis error while fetching data for key '{key}': {e}")
-    except json.JSONDecodeError as e:
-        logger.error(f"[ERROR]  Error decoding JSON for key '{key}': {e}")
     return None
 
 def store_data_in_redis(redis_client, key, data):
     try:
-        redis_client.set(key, json.dumps(data))
+        encoded = json.dumps(data)
+        # The latest value and its history entry in one round trip
+        pipeline = redis_client.pipeline(transaction=False)
+        pipeline.set(key, encoded)
+        if OUTPUT_HISTORY_MAXLEN:
+            pipeline.xadd(f"{key}{OUTPUT_HISTORY_SUFFIX}", {"data": encoded}, maxlen=OUTPUT_HISTORY_MAXLEN, approximate=True)
+        pipeline.execute()
         logger.info(f"[INFO] Data stored in Redis under key: {key}")
     except redis.RedisError as e:
         logger.error(f"[ERROR] Redis error while storing data for key '{key}': {e}")
     except TypeError as e:
         logger.error(f"[INFO] Error serializing data for key '{key}': {e}")
 
+def poll_inputs(redis_client, key):
+    while True:
+        data = fetch_data_from_redis(redis_client, key)
+        if data:
+            yield data
+        time.sleep(REDIS_MONITORING_PERIOD)
+
+def enable_keyspace_notifications(redis_client):
+    # Keyspace notifications are disabled by default, we need at least 'K' (keyspace channel) and '$' (string commands)
+    try:
+        flags = redis_client.config_get("notify-keyspace-events").get("notify-keyspace-events", "")
+        if "K" in flags and ("$" in flags or "A" in flags):
+            return True
+        redis_client.config_set("notify-keyspace-events", "".join(sorted(set(flags + "K$"))))
+        return True
+    except redis.RedisError as e:
+        logger.warning(f"[WARNING] Could not enable keyspace notifications: {e}")
+        return False
+
+def drain_keyspace_events(pubsub):
+    # Several SETs may arrive while the handler runs; we only need to read the latest value once
+    changed = False
+    message = pubsub.get_message(timeout=0)
+    while message:
+        changed = changed or message["data"] not in IGNORED_KEYSPACE_EVENTS
+        message = pubsub.get_message(timeout=0)
+    return changed
+
+def keyspace_inputs(redis_client, key):
+    db = redis_client.connection_pool.connection_kwargs.get("db", 0)
+    channel = f"__keyspace@{db}__:{key}"
+    while True:
+        pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+        try:
+            pubsub.subscribe(channel)
+            logger.info(f"[INFO] Subscribed to keyspace notifications on: {channel}")
+
+            # Process whatever was already there before we subscribed
+            data = fetch_data_from_redis(redis_client, key)
+            if data:
+                yield data
+
+            while True:
+                message = pubsub.get_message(timeout=REDIS_MONITORING_PERIOD)
+                if not message:
+                    continue
+                changed = message["data"] not in IGNORED_KEYSPACE_EVENTS
+                if not (drain_keyspace_events(pubsub) or changed):
+                    continue
+                data = fetch_data_from_redis(redis_client, key)
+                if data:
+                    yield data
+        except redis.RedisError as e:
+            logger.error(f"[ERROR] Redis error while waiting for keyspace notifications on '{key}': {e}")
+            time.sleep(REDIS_MONITORING_PERIOD)
+        finally:
+            pubsub.close()
+
+def stream_inputs(redis_client, key):
+    # Only entries added after startup are processed
+    last_id = "$"
+    while True:
+        try:
+            entries = redis_client.execute_command("XREAD", "BLOCK", REDIS_MONITORING_PERIOD * 1000, "STREAMS", key, last_id, **{NEVER_DECODE: []})
+        except redis.RedisError as e:
+            logger.error(f"[ERROR] Redis error while reading stream '{key}': {e}")
+            time.sleep(REDIS_MONITORING_PERIOD)
+            continue
+        for _, messages in entries or []:
+            for message_id, fields in messages:
+                last_id = message_id
+                raw = fields.get(REDIS_STREAM_FIELD.encode())
+                if not raw:
+                    message_id = message_id.decode()
+                    logger.warning(f"[WARNING] Stream entry {message_id} has no '{REDIS_STREAM_FIELD}' field, skipping.")
+                    continue
+                data = decode_data(key, raw)
+                if data:
+                    yield data
+
+def get_inputs(redis_client, key):
+    if REDIS_TRIGGER_MODE == "keyspace":
+        if enable_keyspace_notifications(redis_client):
+            return keyspace_inputs(redis_client, key)
+        logger.warning("[WARNING] Falling back to polling mode")
+    elif REDIS_TRIGGER_MODE == "stream":
+        return stream_inputs(redis_client, key)
+    elif REDIS_TRIGGER_MODE != "poll":
+        logger.warning(f"[WARNING] Unknown trigger mode '{REDIS_TRIGGER_MODE}', falling back to polling mode")
+    return poll_inputs(redis_client, key)
+
 def execute_handler(usermodule, data, context):
     try:
         return usermodule.handler(data, context)
@@ -101,10 +223,7 @@ if __name__ == "__main__":
         output_key=REDIS_OUTPUT_KEY
     )
 
-    while True:
-        data = fetch_data_from_redis(redis_client, REDIS_INPUT_KEY)
-        if data:
-            output = execute_handler(usermodule, data, context)
-            if output and REDIS_OUTPUT_KEY:
-                store_data_in_redis(redis_client, REDIS_OUTPUT_KEY, output)
-        time.sleep(REDIS_MONITORING_PERIOD)
+    for data in get_inputs(redis_client, REDIS_INPUT_KEY):
+        output = execute_handler(usermodule, data, context)
+        if output and REDIS_OUTPUT_KEY:
+            store_data_in_redis(redis_client, REDIS_OUTPUT_KEY, output)